@@ -0,0 +1,120 @@
+"""
+Aho-Corasick 多模式匹配与替换
+把 {错误: 正确} 映射一次性编译成自动机，每行文本只需线性扫描一遍即可找出所有模式的出现位置，
+再按"最左最长"规则选出互不重叠的匹配进行替换，结果与映射的顺序无关。
+"""
+
+import os
+import json
+import pickle
+import hashlib
+
+AUTOMATON_VERSION = 1
+
+class AhoCorasick:
+    """
+    goto:  每个状态的转移表 {字符: 下一个状态}
+    fail:  失配指针
+    out:   到达该状态时结束的所有模式长度（已沿失配链合并，按长度降序）
+    """
+
+    def __init__(self, replacements):
+        self.replacements = {pattern: replacement for pattern, replacement in replacements.items() if pattern}
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        for pattern in self.replacements:
+            self._insert(pattern)
+        self._build_fail_links()
+
+    def _insert(self, pattern):
+        state = 0
+        for char in pattern:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(())
+            state = next_state
+        self.out[state] = (len(pattern),)
+
+    def _build_fail_links(self):
+        # 按广度优先顺序计算失配指针，父节点总是先于子节点处理
+        queue = list(self.goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                f = self.fail[state]
+                while f and char not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                # 合并失配链上的输出：在 child 结束的模式 + 在其最长真后缀状态结束的模式
+                self.out[child] = tuple(sorted(set(self.out[child] + self.out[self.fail[child]]), reverse=True))
+
+    def longest_by_start(self, text):
+        """扫描一遍文本，返回 {起始位置: 从该位置开始的最长模式长度}"""
+        best = {}
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length in out[state]:
+                start = end - length
+                if best.get(start, 0) < length:
+                    best[start] = length
+        return best
+
+    def replace(self, text):
+        """按最左最长规则替换所有匹配，返回 (新文本, 替换次数)"""
+        best = self.longest_by_start(text)
+        if not best:
+            return text, 0
+        pieces = []
+        count = 0
+        i = 0
+        n = len(text)
+        while i < n:
+            length = best.get(i)
+            if length:
+                pieces.append(self.replacements[text[i:i + length]])
+                i += length
+                count += 1
+            else:
+                pieces.append(text[i])
+                i += 1
+        return "".join(pieces), count
+
+def replacements_key(replacements):
+    payload = json.dumps(replacements, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{AUTOMATON_VERSION}:{payload}".encode("utf-8")).hexdigest()
+
+def load_or_build(replacements, cache_path=None):
+    """
+    返回编译好的自动机。cache_path 不为空时，按映射内容的哈希缓存 pickle 文件，
+    映射没变就直接加载，变了就重新编译并覆盖缓存。
+    """
+    key = replacements_key(replacements)
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                cached = pickle.load(f)
+            if cached.get("key") == key:
+                return cached["automaton"]
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError):
+            pass
+
+    automaton = AhoCorasick(replacements)
+    if cache_path:
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"key": key, "automaton": automaton}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    return automaton
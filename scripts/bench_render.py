@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+渲染性能基准测试套件
+用 ffmpeg lavfi 在本地生成合成源视频 (testsrc2 画面 + 正弦波音轨，时长可配置)，
+按不同片段数量和解说长度生成策略 JSON，在每种渲染模式下完整运行 produce_short_video.py，
+报告 片段/分钟、实时倍率、峰值内存 (进程树合计 RSS) 和成片体积。
+完全离线，只依赖 ffmpeg，结果可以在不同机器之间对比。
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+
+# Add script directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import produce_short_video as psv
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "produce_short_video.py")
+SAMPLE_COMMENTARY = "这是一段用于基准测试的解说文字\n看看渲染速度到底差多少\n您觉得哪个更快？"
+RSS_SAMPLE_INTERVAL = 0.1  # 进程树内存采样间隔（秒）
+COMMENTARY_CHARS = "庄嫂这番话说得太有水平了农村来的没文化人家情商高着呢这种场面您敢上吗"
+
+def find_font(preferred=None):
+    """优先使用指定字体，其次是 produce_short_video 的默认字体，最后用 fc-match 找一个系统字体"""
+    for candidate in [preferred, psv.FONT_PATH]:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    try:
+        result = subprocess.run(["fc-match", "-f", "%{file}", "sans"], capture_output=True, text=True, check=True)
+        if result.stdout and os.path.exists(result.stdout):
+            return result.stdout
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return None
+
+def make_synthetic_source(path, duration, size="1920x1080", rate=25):
+    """生成合成源视频: testsrc2 画面 + 440Hz 正弦波音轨"""
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={rate}:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={duration}",
+        "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-shortest", "-y", path
+    ]
+    subprocess.run(cmd, check=True)
+
+def format_hms(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}"
+
+def make_clips(count, clip_length, source_duration, commentary=SAMPLE_COMMENTARY):
+    """在源视频上均匀排布 count 个片段"""
+    step = max(clip_length, (source_duration - clip_length) / max(1, count))
+    clips = []
+    for i in range(count):
+        start = min(i * step, source_duration - clip_length)
+        clips.append({
+            "id": f"clip_{i + 1}",
+            "time_range": {"start": format_hms(start), "end": format_hms(start + clip_length)},
+            "duration": clip_length,
+            "title": f"基准测试片段 {i + 1}",
+            "commentary_text": commentary,
+        })
+    return clips
+
+def make_synthetic_avatar(path):
+    subprocess.run([
+        "ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc2=size=400x400",
+        "-frames:v", "1", "-y", path
+    ], check=True)
+
+def time_filter_graph(inputs, filter_complex, runs=3):
+    """只跑解码 + 滤镜（输出到 null），返回多次运行中最快的一次耗时"""
+    cmd = ["ffmpeg", "-v", "error"] + inputs + ["-filter_complex", filter_complex, "-f", "null", "-"]
+    best = None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, check=True)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def bench_avatar(avatar_path, work_dir, clip_length):
+    """
+    对比头像路径: 旧方案在渲染图里对头像执行 geq 圆形遮罩，新方案直接叠加预处理好的 PNG。
+    背景用 1080x1920 纯色源，排除其它滤镜的干扰。
+    """
+    background = ["-f", "lavfi", "-i", f"color=gray:size=1080x1920:rate=25:duration={clip_length}"]
+    legacy = time_filter_graph(
+        background + ["-i", avatar_path],
+        f"[1:v]{psv.AVATAR_ROUND_FILTER}[avatar_round];[0:v][avatar_round]overlay=110:1410"
+    )
+    t0 = time.perf_counter()
+    round_path = psv.prepare_avatar(avatar_path, os.path.join(work_dir, "assets_avatar_bench"))
+    prepare_time = time.perf_counter() - t0
+    cached = time_filter_graph(
+        background + ["-i", round_path],
+        "[0:v][1:v]overlay=110:1410"
+    )
+    print("\n" + "-" * 60)
+    print(f"头像路径 ({clip_length}s, 1080x1920):")
+    print(f"  geq 遮罩 (旧):      {legacy:.3f}s")
+    print(f"  预处理 PNG (新):    {cached:.3f}s  (一次性预处理 {prepare_time:.3f}s)")
+    print("-" * 60)
+
+def bench_background(video_path, clip_length, rate=25):
+    """
+    对比模糊背景分支的滤镜阶段 fps: 竖屏背景 + 前景叠加，不含文字和编码。
+    """
+    print("\n" + "-" * 60)
+    print(f"模糊背景滤镜阶段 ({clip_length}s 合成源):")
+    frames = clip_length * rate
+    for bg_mode in psv.BG_MODES:
+        graph = (
+            "[0:v]split=2[bg][main];"
+            f"{psv.background_filter(bg_mode)};"
+            "[main]scale=1080:-1[main_scaled];"
+            "[bg_blurred][main_scaled]overlay=0:(H-h)/2"
+        )
+        elapsed = time_filter_graph(["-t", str(clip_length), "-i", video_path], graph)
+        print(f"  {bg_mode:<8} {elapsed:.3f}s  ({frames / elapsed:.1f} fps)")
+    print("-" * 60)
+
+def make_commentary(length, line_chars=14):
+    """生成指定字数的解说词，每 line_chars 个字换一行"""
+    text = (COMMENTARY_CHARS * (length // len(COMMENTARY_CHARS) + 1))[:length]
+    return "\n".join(text[i:i + line_chars] for i in range(0, len(text), line_chars))
+
+def expected_output_duration(mode, clips):
+    """成片时长: 逐片段模式为各片段之和，整集模式每个转场重叠 2 × FADE_DURATION"""
+    durations = [
+        psv.time_to_seconds(c["time_range"]["end"]) - psv.time_to_seconds(c["time_range"]["start"])
+        for c in clips
+    ]
+    total = sum(durations)
+    if mode == "episode":
+        total -= (len(clips) - 1) * psv.FADE_DURATION * 2
+    return total
+
+def process_tree_rss(root_pid):
+    """通过 /proc 统计 root_pid 及其所有子孙进程当前的 RSS 之和（字节）；不支持 /proc 的系统返回 None"""
+    try:
+        pids = [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return None
+    children = {}
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as f:
+                # 第二个字段 (comm) 可能含空格，从最后一个 ")" 之后开始解析
+                ppid = int(f.read().rsplit(b")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(pid)
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/statm", "rb") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, ValueError, IndexError):
+            continue
+    return total
+
+def run_measured(cmd, log_path):
+    """
+    运行子进程并返回 (退出码, 墙钟耗时, 进程树峰值 RSS MB, 单进程最大 RSS MB)。
+    进程树峰值: 运行期间每 RSS_SAMPLE_INTERVAL 秒采样一次整棵进程树的 RSS 之和，
+    能反映 --jobs > 1 时多个 ffmpeg 同时占用的内存（无 /proc 的系统上为 None）。
+    单进程最大: wait4 的 ru_maxrss，是整棵树里 RSS 最大的那一个进程，而不是合计。
+    """
+    peak = {"rss": None}
+    done = threading.Event()
+
+    def sample(pid):
+        while not done.is_set():
+            rss = process_tree_rss(pid)
+            if rss is not None and (peak["rss"] is None or rss > peak["rss"]):
+                peak["rss"] = rss
+            done.wait(RSS_SAMPLE_INTERVAL)
+
+    with open(log_path, "w", encoding="utf-8") as log:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+        sampler = threading.Thread(target=sample, args=(proc.pid,), daemon=True)
+        sampler.start()
+        _, status, rusage = os.wait4(proc.pid, 0)
+        elapsed = time.perf_counter() - t0
+        done.set()
+        sampler.join()
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # Linux 上 ru_maxrss 单位为 KB，macOS 为字节
+    max_process_rss_mb = rusage.ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+    tree_rss_mb = peak["rss"] / 1024 ** 2 if peak["rss"] is not None else None
+    return proc.returncode, elapsed, tree_rss_mb, max_process_rss_mb
+
+def setup_series(work_dir, avatar_path=None):
+    """建立 produce_short_video 期望的 series/<name>/{downloads,config,images} 目录结构"""
+    series_root = os.path.join(work_dir, "series", "synthetic")
+    for d in ["downloads", "config", "output"]:
+        os.makedirs(os.path.join(series_root, d), exist_ok=True)
+    if avatar_path:
+        os.makedirs(os.path.join(series_root, "images"), exist_ok=True)
+        shutil.copy(avatar_path, os.path.join(series_root, "images", "2.jpg"))
+    return series_root
+
+def run_case(series_root, source_path, case_name, clips, mode, font_path, jobs=1, bg_mode="lowres"):
+    """在干净的 temp_clips 下完整渲染一次，返回结果字典"""
+    # 每个用例一个源视频链接，文件名决定策略和成片的名字
+    video_path = os.path.join(series_root, "downloads", f"{case_name}.mp4")
+    if not os.path.exists(video_path):
+        os.symlink(os.path.abspath(source_path), video_path)
+    config_path = os.path.join(series_root, "config", f"{case_name}-Strategy.json")
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump({"clips": clips}, f, ensure_ascii=False, indent=2)
+
+    # 清空渲染缓存，保证每次都是完整渲染
+    shutil.rmtree(os.path.join(series_root, "temp_clips"), ignore_errors=True)
+    output_path = os.path.join(series_root, "output", f"{case_name}-Clip.mp4")
+    if os.path.exists(output_path):
+        os.remove(output_path)
+
+    cmd = [
+        sys.executable, SCRIPT_PATH, config_path,
+        "--mode", mode, "--bg-mode", bg_mode, "--jobs", str(jobs), "--font", font_path
+    ]
+    log_path = os.path.join(series_root, "output", f"{case_name}-{mode}.log")
+    returncode, wall, peak_rss_mb, max_process_rss_mb = run_measured(cmd, log_path)
+
+    ok = returncode == 0 and os.path.exists(output_path)
+    media = expected_output_duration(mode, clips)
+    return {
+        "case": case_name,
+        "mode": mode,
+        "clips": len(clips),
+        "ok": ok,
+        "wall_time": round(wall, 3),
+        "seconds_per_clip": round(wall / len(clips), 3),
+        "clips_per_minute": round(len(clips) / wall * 60, 2) if ok else None,
+        "realtime_factor": round(media / wall, 3) if ok else None,
+        "peak_rss_mb": round(peak_rss_mb, 1) if peak_rss_mb is not None else None,
+        "max_process_rss_mb": round(max_process_rss_mb, 1),
+        "output_mb": round(os.path.getsize(output_path) / 1024 ** 2, 2) if ok else None,
+        "log": log_path,
+    }
+
+def format_mb(value):
+    return f"{value:.0f}MB" if value is not None else "-"
+
+def print_report(results):
+    # 合计RSS: 进程树 RSS 之和的峰值（采样）；单进程RSS: 树中 RSS 最大的单个进程
+    print("\n" + "-" * 126)
+    print(f"{'用例':<22} | {'模式':<9} | {'片段':<4} | {'耗时':<9} | {'秒/片段':<8} | {'片段/分钟':<9} | "
+          f"{'实时倍率':<8} | {'合计RSS':<9} | {'单进程RSS':<9} | {'体积':<8}")
+    print("-" * 126)
+    for r in results:
+        if not r["ok"]:
+            print(f"{r['case']:<22} | {r['mode']:<9} | {r['clips']:<4} | ❌ 渲染失败，日志: {r['log']}")
+            continue
+        print(f"{r['case']:<22} | {r['mode']:<9} | {r['clips']:<4} | {r['wall_time']:>7.1f}s | "
+              f"{r['seconds_per_clip']:>6.1f}s | {r['clips_per_minute']:>9.2f} | {r['realtime_factor']:>7.2f}x | "
+              f"{format_mb(r['peak_rss_mb']):>8} | {format_mb(r['max_process_rss_mb']):>8} | {r['output_mb']:>6.1f}MB")
+    print("-" * 126)
+
+def parse_int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="produce_short_video 渲染基准测试套件（合成媒体，离线运行）")
+    parser.add_argument("--duration", type=int, default=120, help="合成源视频时长（秒，默认 120）")
+    parser.add_argument("--clip-counts", default="3", help="片段数量，逗号分隔（默认 3）")
+    parser.add_argument("--commentary-lengths", default="40",
+                        help="解说字数，逗号分隔（默认 40），用于观察解说长度对渲染的影响")
+    parser.add_argument("--clip-length", type=int, default=20, help="每个片段时长（秒，默认 20）")
+    parser.add_argument("--modes", default=",".join(psv.RENDER_MODES),
+                        help=f"要对比的渲染模式，逗号分隔（默认: {','.join(psv.RENDER_MODES)}）")
+    parser.add_argument("--jobs", type=int, default=1, help="传给 produce_short_video 的 --jobs（默认 1）")
+    parser.add_argument("--bg-mode", choices=psv.BG_MODES, default="lowres", help="渲染时使用的模糊背景模式（默认 lowres）")
+    parser.add_argument("--font", help="字体文件路径（默认自动查找）")
+    parser.add_argument("--avatar", help="头像图片路径（默认使用合成头像）")
+    parser.add_argument("--no-avatar", action="store_true", help="不使用头像")
+    parser.add_argument("--avatar-bench", action="store_true",
+                        help="额外对比头像路径: 渲染时 geq 遮罩 vs 预处理圆形 PNG")
+    parser.add_argument("--bg-bench", action="store_true",
+                        help="额外对比模糊背景分支的滤镜阶段 fps: 全分辨率 vs 低分辨率")
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    parser.add_argument("--work-dir", help="工作目录（默认使用临时目录，结束后删除）")
+    args = parser.parse_args()
+
+    font_path = find_font(args.font)
+    if not font_path:
+        print("❌ 找不到可用字体，请用 --font 指定")
+        sys.exit(1)
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    for mode in modes:
+        if mode not in psv.RENDER_MODES:
+            print(f"❌ 未知渲染模式: {mode}")
+            sys.exit(1)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench_render_")
+    os.makedirs(work_dir, exist_ok=True)
+
+    try:
+        source_path = os.path.join(work_dir, f"synthetic_{args.duration}s.mp4")
+        if not os.path.exists(source_path):
+            print(f"🧪 生成合成源视频 ({args.duration}s)...")
+            make_synthetic_source(source_path, args.duration)
+
+        avatar_path = None
+        if not args.no_avatar:
+            avatar_path = args.avatar or os.path.join(work_dir, "avatar.jpg")
+            if not os.path.exists(avatar_path):
+                make_synthetic_avatar(avatar_path)
+
+        if args.avatar_bench and avatar_path:
+            bench_avatar(avatar_path, work_dir, args.clip_length)
+        if args.bg_bench:
+            bench_background(source_path, args.clip_length)
+
+        series_root = setup_series(work_dir, avatar_path)
+        results = []
+        for clip_count in parse_int_list(args.clip_counts):
+            for commentary_length in parse_int_list(args.commentary_lengths):
+                clips = make_clips(clip_count, args.clip_length, args.duration, make_commentary(commentary_length))
+                case_name = f"c{clip_count}_t{commentary_length}"
+                for mode in modes:
+                    print(f"⏱️ {case_name} [{mode}] ...", flush=True)
+                    result = run_case(series_root, source_path, case_name, clips, mode, font_path,
+                                      jobs=args.jobs, bg_mode=args.bg_mode)
+                    result["commentary_chars"] = commentary_length
+                    results.append(result)
+
+        print_report(results)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump({
+                    "machine": {"platform": sys.platform, "cpu_count": os.cpu_count()},
+                    "source_duration": args.duration,
+                    "clip_length": args.clip_length,
+                    "jobs": args.jobs,
+                    "bg_mode": args.bg_mode,
+                    "results": results,
+                }, f, ensure_ascii=False, indent=2)
+            print(f"📊 结果已写入: {args.output}")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -4,24 +4,23 @@
 """
 
 import os
-import subprocess
+import csv
+import json
 import argparse
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Add script directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import media_probe
+
+TOLERANCE = 1.0  # 允许的时长差异（秒）
+DEFAULT_WORKERS = min(8, (os.cpu_count() or 1) * 2)
 
 def get_duration(file_path):
-    """获取文件时长（秒）"""
-    try:
-        cmd = [
-            "ffprobe", 
-            "-v", "error", 
-            "-show_entries", "format=duration", 
-            "-of", "default=noprint_wrappers=1:nokey=1", 
-            file_path
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return float(result.stdout.strip())
-    except (ValueError, subprocess.CalledProcessError):
-        return 0.0
+    """获取文件时长（秒），探测结果由 media_probe 缓存"""
+    return media_probe.get_duration(file_path) or 0.0
 
 def format_time(seconds):
     """格式化时间为 MM:SS"""
@@ -29,62 +28,127 @@ def format_time(seconds):
     s = int(seconds % 60)
     return f"{m}:{s:02d}"
 
-def check_directory(directory):
+def find_audio(directory, base_name):
+    """查找对应的音频文件 (优先 wav, 然后 mp3)，返回 (路径, 类型)"""
+    for ext, audio_type in ((".wav", "WAV"), (".mp3", "MP3")):
+        audio_path = os.path.join(directory, f"{base_name}{ext}")
+        if os.path.exists(audio_path):
+            return audio_path, audio_type
+    return None, None
+
+def check_pair(mp4_path, audio_path, audio_type, tolerance=TOLERANCE):
+    """比较一对文件的容器时长和流时长，返回结果字典"""
+    video = media_probe.probe(mp4_path)
+    audio = media_probe.probe(audio_path)
+    video_dur = video.duration if video and video.duration else 0.0
+    audio_dur = audio.duration if audio and audio.duration else 0.0
+    # 流时长：视频文件取视频流，音频文件取音频流；缺失时退回容器时长
+    video_stream_dur = (video.video_duration if video else None) or video_dur
+    audio_stream_dur = (audio.audio_duration if audio else None) or audio_dur
+    # 源视频自带的音轨，用来区分"源文件本身音频就短"和"提取时被截断"
+    source_audio_dur = video.audio_duration if video else None
+
+    problems = []
+    if not video or not audio:
+        problems.append("无法探测")
+    diff = abs(video_dur - audio_dur)
+    stream_diff = abs(video_stream_dur - audio_stream_dur)
+    if diff > tolerance:
+        problems.append("容器时长不匹配")
+    if stream_diff > tolerance:
+        problems.append("流时长不匹配")
+    if source_audio_dur and video_stream_dur - source_audio_dur > tolerance:
+        problems.append("源视频音轨偏短")
+    if source_audio_dur and source_audio_dur - audio_stream_dur > tolerance:
+        problems.append("音频被截断")
+
+    return {
+        "name": os.path.splitext(os.path.basename(mp4_path))[0],
+        "video": mp4_path,
+        "audio": audio_path,
+        "audio_type": audio_type,
+        "video_duration": round(video_dur, 3),
+        "audio_duration": round(audio_dur, 3),
+        "video_stream_duration": round(video_stream_dur, 3),
+        "audio_stream_duration": round(audio_stream_dur, 3),
+        "source_audio_duration": round(source_audio_dur, 3) if source_audio_dur else None,
+        "diff": round(diff, 3),
+        "stream_diff": round(stream_diff, 3),
+        "ok": not problems,
+        "problems": problems,
+    }
+
+def check_directory(directory, workers=None, tolerance=TOLERANCE):
+    """并发探测目录下所有 mp4 及其对应音频，返回结果列表（按文件名排序），目录不存在时返回 None"""
     if not os.path.exists(directory):
         print(f"目录不存在: {directory}")
-        return
-
-    print(f"正在检查目录: {directory}")
-    print("-" * 80)
-    print(f"{'文件名':<30} | {'视频时长':<10} | {'音频时长':<10} | {'差异':<10} | {'状态':<10}")
-    print("-" * 80)
+        return None
 
     # 获取所有 mp4 文件
     mp4_files = sorted([f for f in os.listdir(directory) if f.lower().endswith('.mp4')])
-    
-    issues_found = 0
-    
+    pairs = []
     for mp4_file in mp4_files:
         base_name = os.path.splitext(mp4_file)[0]
-        mp4_path = os.path.join(directory, mp4_file)
-        
-        # 查找对应的音频文件 (优先 wav, 然后 mp3)
-        audio_file = None
-        audio_path = None
-        audio_type = None
-        
-        if os.path.exists(os.path.join(directory, f"{base_name}.wav")):
-            audio_file = f"{base_name}.wav"
-            audio_path = os.path.join(directory, audio_file)
-            audio_type = "WAV"
-        elif os.path.exists(os.path.join(directory, f"{base_name}.mp3")):
-            audio_file = f"{base_name}.mp3"
-            audio_path = os.path.join(directory, audio_file)
-            audio_type = "MP3"
-            
-        if not audio_path:
-            # print(f"{mp4_file:<30} | 未找到对应的音频文件")
-            continue
-            
-        # 获取时长
-        video_dur = get_duration(mp4_path)
-        audio_dur = get_duration(audio_path)
-        
-        diff = abs(video_dur - audio_dur)
-        status = "✅ 正常" if diff <= 1.0 else "❌ 不匹配"
-        
-        # 显示所有文件的检查结果
-        print(f"{base_name:<30} | {format_time(video_dur):<10} | {format_time(audio_dur):<10} ({audio_type}) | {diff:.2f}s     | {status}")
-        
-        if diff > 1.0:
-            issues_found += 1
-            
-    print("-" * 80)
+        audio_path, audio_type = find_audio(directory, base_name)
+        if audio_path:
+            pairs.append((os.path.join(directory, mp4_file), audio_path, audio_type))
+
+    # ffprobe 是独立进程，用线程池并发即可；media_probe 缓存命中时不会启动进程
+    with ThreadPoolExecutor(max_workers=workers or DEFAULT_WORKERS) as executor:
+        return list(executor.map(lambda pair: check_pair(*pair, tolerance=tolerance), pairs))
+
+def print_report(directory, results):
+    print(f"正在检查目录: {directory}")
+    print("-" * 110)
+    print(f"{'文件名':<30} | {'视频时长':<10} | {'音频时长':<16} | {'差异':<8} | {'流差异':<8} | {'状态':<10}")
+    print("-" * 110)
+    for r in results:
+        status = "✅ 正常" if r["ok"] else "❌ " + "、".join(r["problems"])
+        print(f"{r['name']:<30} | {format_time(r['video_duration']):<10} | "
+              f"{format_time(r['audio_duration']) + ' (' + r['audio_type'] + ')':<16} | "
+              f"{r['diff']:.2f}s    | {r['stream_diff']:.2f}s    | {status}")
+    print("-" * 110)
+
+    issues_found = sum(1 for r in results if not r["ok"])
     if issues_found == 0:
         print("所有检查的文件时长均匹配。")
     else:
         print(f"发现 {issues_found} 个文件时长不匹配。")
 
+def write_json(results, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"results": results, "issues": sum(1 for r in results if not r["ok"])},
+                  f, ensure_ascii=False, indent=2)
+
+def write_csv(results, path):
+    columns = ["name", "audio_type", "video_duration", "audio_duration", "video_stream_duration",
+               "audio_stream_duration", "source_audio_duration", "diff", "stream_diff", "ok", "problems",
+               "video", "audio"]
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        for r in results:
+            writer.writerow({**r, "problems": ";".join(r["problems"])})
+
 if __name__ == "__main__":
-    target_dir = sys.argv[1] if len(sys.argv) > 1 else "series/jinhun/downloads"
-    check_directory(target_dir)
+    parser = argparse.ArgumentParser(description="检查视频文件和对应的音频文件时长是否一致")
+    parser.add_argument("directory", nargs="?", default="series/jinhun/downloads", help="视频目录 (默认: series/jinhun/downloads)")
+    parser.add_argument("-j", "--workers", type=int, help=f"并发探测数 (默认: {DEFAULT_WORKERS})")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help=f"允许的时长差异 (秒，默认: {TOLERANCE})")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    parser.add_argument("--csv", help="把结果写入 CSV 文件")
+    args = parser.parse_args()
+
+    results = check_directory(args.directory, workers=args.workers, tolerance=args.tolerance)
+    if results is None:
+        sys.exit(2)
+    print_report(args.directory, results)
+    if args.json:
+        write_json(results, args.json)
+        print(f"📊 JSON 报告: {args.json}")
+    if args.csv:
+        write_csv(results, args.csv)
+        print(f"📊 CSV 报告: {args.csv}")
+
+    # 有问题时返回非零退出码，方便在流水线中作为下一步的前置检查
+    sys.exit(1 if any(not r["ok"] for r in results) else 0)
@@ -1,47 +1,109 @@
 import opencc
 import argparse
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Add script directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from subtitle import SubtitleTrack
+
+_converter = None
+
+def get_converter():
+    # Loading the t2s dictionaries is the expensive part: do it once per process
+    global _converter
+    if _converter is None:
+        _converter = opencc.OpenCC('t2s')
+    return _converter
 
 def convert_to_simplified(text):
-    converter = opencc.OpenCC('t2s')
-    return converter.convert(text)
+    return get_converter().convert(text)
+
+def convert_lines(texts):
+    """Converts a list of single-line strings with one OpenCC call."""
+    if not texts:
+        return []
+    converted = convert_to_simplified("\n".join(texts)).split("\n")
+    if len(converted) != len(texts):
+        # OpenCC never adds or removes newlines, but fall back to per-line conversion rather than misalign
+        converted = [convert_to_simplified(text) for text in texts]
+    return converted
 
 def process_srt(file_path):
     print(f"Converting {file_path} to Simplified Chinese...")
-    
-    with open(file_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-        
-    output_lines = []
+    start_time = time.perf_counter()
+
+    track = SubtitleTrack.load(file_path)
+
+    # Batch every text line of the file into a single conversion
+    positions = []
+    texts = []
+    for cue, line_no, line in track.text_lines():
+        positions.append((cue, line_no))
+        texts.append(line)
+
+    cue_lines = [text.split("\n") for text in track.texts]
     converted_count = 0
-    
-    for line in lines:
-        # Simple check to only convert text lines (not index or timestamp)
-        clean_line = line.strip()
-        if not clean_line.isdigit() and '-->' not in clean_line and clean_line:
-            simplified = convert_to_simplified(line)
-            if simplified != line:
-                converted_count += 1
-            output_lines.append(simplified)
-        else:
-            output_lines.append(line)
-            
-    # Overwrite the original file or save as new
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.writelines(output_lines)
-        
-    print(f"Converted {converted_count} lines.")
+    for (cue, line_no), text, simplified in zip(positions, texts, convert_lines(texts)):
+        if simplified != text:
+            converted_count += 1
+            cue_lines[cue][line_no] = simplified
+
+    # Overwrite the original file atomically (only when something changed)
+    if converted_count:
+        track.texts = ["\n".join(lines) for lines in cue_lines]
+        track.save(file_path)
+
+    elapsed = time.perf_counter() - start_time
+    rate = len(texts) / elapsed if elapsed > 0 else 0
+    print(f"Converted {converted_count} lines ({len(texts)} text lines, {rate:,.0f} lines/sec).")
+    return {"file": file_path, "lines": len(texts), "converted": converted_count, "elapsed": elapsed}
+
+def process_srt_safe(file_path):
+    """process_srt for batch mode: a broken file becomes a failed entry instead of aborting the other files."""
+    try:
+        return process_srt(file_path)
+    except (OSError, ValueError) as e:
+        print(f"❌ {os.path.basename(file_path)} failed: {e}")
+        return {"file": file_path, "error": str(e)}
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Convert SRT subtitles from Traditional to Simplified Chinese")
     parser.add_argument("path", help="Path to SRT file or directory")
-    
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Files converted in parallel in directory mode (default: CPU count)")
+
     args = parser.parse_args()
-    
+
     if os.path.isdir(args.path):
+        srt_files = []
         for root, dirs, files in os.walk(args.path):
             for file in files:
                 if file.endswith(".srt"):
-                    process_srt(os.path.join(root, file))
+                    srt_files.append(os.path.join(root, file))
+        srt_files.sort()
+
+        start_time = time.perf_counter()
+        if args.jobs > 1 and len(srt_files) > 1:
+            with ProcessPoolExecutor(max_workers=min(args.jobs, len(srt_files))) as executor:
+                results = list(executor.map(process_srt_safe, srt_files))
+        else:
+            results = [process_srt_safe(path) for path in srt_files]
+        elapsed = time.perf_counter() - start_time
+
+        failed = [r for r in results if "error" in r]
+        done = [r for r in results if "error" not in r]
+        total_lines = sum(r["lines"] for r in done)
+        total_converted = sum(r["converted"] for r in done)
+        rate = total_lines / elapsed if elapsed > 0 else 0
+        print(f"Done: {len(done)}/{len(results)} files, {total_converted}/{total_lines} lines converted "
+              f"in {elapsed:.2f}s ({rate:,.0f} lines/sec)")
+        for r in failed:
+            print(f"{r['file']} | failed: {r['error']}")
+        if failed:
+            sys.exit(1)
     else:
         process_srt(args.path)
@@ -1,198 +1,253 @@
 #!/usr/bin/env python3
 """
-从 MP4 视频文件中提取 MP3 音频文件
-使用 ffmpeg 进行音频提取
+从 MP4 视频文件中提取音频 (WAV / MP3 / 语音识别用 16kHz WAV)
+使用 ffmpeg 进行音频提取，一次解码写出所有需要的格式
 """
 
 import os
+import wave
+import time
 import subprocess
 import argparse
 import sys
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 
-def extract_audio(video_path, output_path=None, bitrate="192k", non_interactive=False):
+# Add script directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import media_probe
+
+# 每种输出格式的文件后缀和编码参数，同一次解码可以同时写出多种
+OUTPUT_FORMATS = {
+    # WAV (PCM 无损，44.1kHz 立体声)
+    "wav": {"suffix": ".wav", "args": ["-acodec", "pcm_s16le", "-ar", "44100", "-ac", "2"]},
+    # MP3：使用 CBR 模式 (-b:a) 而非 VBR，并禁用比特库 (reservoir=0)，以确保输出时长与输入一致
+    "mp3": {"suffix": ".mp3", "args": [
+        "-acodec", "libmp3lame", "-ar", "44100", "-ac", "2",
+        "-compression_level", "0",  # 最快编码，减少潜在问题
+        "-reservoir", "0",  # 禁用比特库，确保帧对齐
+    ]},
+    # 语音识别用 WAV (16kHz 单声道，Whisper 的输入格式)
+    "asr": {"suffix": ".16k.wav", "args": ["-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1"]},
+}
+
+def probe_duration(file_path):
+    """获取容器时长（秒），失败返回 None；探测结果由 media_probe 缓存"""
+    return media_probe.get_duration(file_path)
+
+def output_duration(path, fmt, bitrate):
     """
-    从视频文件提取音频为 MP3 格式
-    
+    不再启动 ffprobe，直接从输出文件推算时长：
+    WAV 读文件头；CBR MP3 用 文件大小 / 比特率（误差只有帧头和标签，远小于 1 秒的容差）
+    """
+    if fmt in ("wav", "asr"):
+        with wave.open(path, "rb") as w:
+            return w.getnframes() / w.getframerate()
+    if fmt == "mp3":
+        return os.path.getsize(path) * 8 / (int(bitrate.rstrip("kK")) * 1000)
+    return probe_duration(path)
+
+def encode_args(fmt, output_path, bitrate):
+    if fmt in OUTPUT_FORMATS:
+        args = list(OUTPUT_FORMATS[fmt]["args"])
+        if fmt == "mp3":
+            args += ["-b:a", bitrate]
+    else:
+        # 其他扩展名：交给 ffmpeg 按扩展名选择默认编码器
+        args = ["-ar", "44100", "-ac", "2"]
+    return ["-map", "0:a:0", "-vn"] + args + [output_path]
+
+def part_path(output_path):
+    # 保留扩展名，ffmpeg 靠它识别输出格式
+    base, ext = os.path.splitext(output_path)
+    return f"{base}.part{ext}"
+
+def extract_audio(video_path, output_path=None, bitrate="192k", non_interactive=False, formats=None,
+                  io_slot=None, stats=None):
+    """
+    从视频文件提取音频，一次解码同时写出所有请求的格式
+
     Args:
         video_path: 输入视频文件路径
-        output_path: 输出音频文件路径（可选，默认与视频同目录）
+        output_path: 输出音频文件路径（可选，默认与视频同目录；格式由扩展名决定）
         bitrate: MP3 比特率（默认 192k）
+        formats: 要输出的格式列表，取值见 OUTPUT_FORMATS（默认只输出 wav）
+        io_slot: 可选的信号量，ffmpeg 运行期间占用一个名额（批处理时用于限制同一块磁盘上同时进行的任务数）
+        stats: 可选的字典，写入 duration（视频时长）和 skipped（是否全部跳过），供批处理汇总
     """
+    if stats is None:
+        stats = {}
+    stats.update(duration=None, skipped=False)
     if not os.path.exists(video_path):
         print(f"错误: 文件不存在: {video_path}")
         return False
-    
-    # 如果没有指定输出路径，使用与视频文件相同的目录和名称
-    if output_path is None:
-        base_name = os.path.splitext(video_path)[0]
-        output_path = f"{base_name}.wav"
-    
-    # 检查输出文件是否已存在，如果存在则直接跳过
-    if os.path.exists(output_path):
-        print(f"跳过: {os.path.basename(output_path)} 已存在")
+
+    base_name = os.path.splitext(video_path)[0]
+    if output_path is not None:
+        # 指定输出路径时，格式由扩展名决定
+        ext = os.path.splitext(output_path)[1].lower()
+        fmt = next((name for name, spec in OUTPUT_FORMATS.items() if spec["suffix"] == ext), ext.lstrip("."))
+        outputs = [(fmt, output_path)]
+    else:
+        # 如果没有指定输出路径，使用与视频文件相同的目录和名称
+        outputs = [(fmt, f"{base_name}{OUTPUT_FORMATS[fmt]['suffix']}") for fmt in (formats or ["wav"])]
+
+    # 检查输出文件是否已存在，已存在的直接跳过
+    pending = []
+    for fmt, path in outputs:
+        if os.path.exists(path):
+            print(f"跳过: {os.path.basename(path)} 已存在")
+        else:
+            pending.append((fmt, path))
+    if not pending:
+        stats["skipped"] = True
         return True  # 返回 True 表示"成功"（因为文件已存在，无需处理）
-    
+
     print(f"正在从 {video_path} 提取音频...")
-    print(f"输出文件: {output_path}")
-    
-    # 先获取视频时长，确保完整提取
-    try:
-        duration_result = subprocess.run(
-            ["ffprobe", "-v", "error", "-show_entries", "format=duration",
-             "-of", "default=noprint_wrappers=1:nokey=1", video_path],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        video_duration = duration_result.stdout.strip()
-        if video_duration:
-            duration_sec = float(video_duration)
-            minutes = int(duration_sec // 60)
-            seconds = int(duration_sec % 60)
-            print(f"视频时长: {duration_sec:.2f} 秒 ({minutes}:{seconds:02d})")
-    except Exception as e:
-        print(f"⚠ 无法获取视频时长，将尝试完整提取: {e}")
-        video_duration = None
-    
-    # 使用 ffmpeg 提取音频
-    # 关键：将 -ss 0 放在 -i 之前可以更准确地定位起始位置
-    # -ss 0: 从开始位置（放在 -i 之前更精确）
-    # -i: 输入文件
+    for fmt, path in pending:
+        print(f"输出文件: {path}")
+
+    # 先获取视频时长，确保完整提取；结束后的时长校验也复用这次结果
+    duration_sec = probe_duration(video_path)
+    if duration_sec is None:
+        print("⚠ 无法获取视频时长，将尝试完整提取")
+    else:
+        minutes = int(duration_sec // 60)
+        seconds = int(duration_sec % 60)
+        print(f"视频时长: {duration_sec:.2f} 秒 ({minutes}:{seconds:02d})")
+    stats["duration"] = duration_sec
+
+    # 使用 ffmpeg 提取音频：一个输入、多个输出，音频只解码一次，不再生成临时 WAV
     # -map 0:a:0: 明确映射第一个音频流
     # -vn: 不包含视频流
-    # -t: 指定时长（如果获取到了视频时长）
-    # -acodec libmp3lame: 使用 MP3 编码器
-    # -ab: 音频比特率
-    # -avoid_negative_ts make_zero: 处理时间戳问题，确保完整提取
     # -y: 自动覆盖输出文件（如果存在）
-    
-    # 根据输出文件扩展名决定处理方式
-    ext = os.path.splitext(output_path)[1].lower()
-    
-    if ext == '.wav':
-        # 直接提取 WAV (PCM 无损)
-        print(f"提取 WAV 文件 (PCM 无损)...")
-        cmd = [
-            "ffmpeg",
-            "-i", video_path,
-            "-map", "0:a:0",
-            "-vn",
-            "-acodec", "pcm_s16le",
-            "-ar", "44100",
-            "-ac", "2",
-            "-y",
-            output_path
-        ]
-        
-        try:
-            subprocess.run(cmd, check=True, capture_output=True)
-        except subprocess.CalledProcessError as e:
-            print(f"提取 WAV 失败: {e}")
-            return False
-            
-    else:
-        # MP3 或其他格式：使用两步法（先提取为 WAV，再转为目标格式）
-        # 这种方法可以解决很多因容器或编码问题导致的时长不一致问题
-        wav_path = f"{os.path.splitext(output_path)[0]}_temp.wav"
-        
-        print(f"步骤 1/2: 提取临时 WAV 文件...")
-        cmd_wav = [
-            "ffmpeg",
-            "-i", video_path,
-            "-map", "0:a:0",
-            "-vn",
-            "-acodec", "pcm_s16le",
-            "-ar", "44100",
-            "-ac", "2",
-            "-y",
-            wav_path
-        ]
-        
-        try:
-            subprocess.run(cmd_wav, check=True, capture_output=True)
-        except subprocess.CalledProcessError as e:
-            print(f"提取 WAV 失败: {e}")
-            if os.path.exists(wav_path):
-                os.remove(wav_path)
-            return False
-
-        print(f"步骤 2/2: 转换 WAV 到 {ext.upper()}...")
-        if ext == '.mp3':
-            # 使用 CBR 模式 (-b:a) 而非 VBR，并禁用比特库 (reservoir=0)
-            # 以确保输出时长与输入一致
-            cmd_convert = [
-                "ffmpeg",
-                "-i", wav_path,
-                "-acodec", "libmp3lame",
-                "-b:a", bitrate,
-                "-compression_level", "0",  # 最快编码，减少潜在问题
-                "-reservoir", "0",  # 禁用比特库，确保帧对齐
-                "-y",
-                output_path
-            ]
-        else:
-            cmd_convert = [
-                "ffmpeg",
-                "-i", wav_path,
-                "-acodec", "copy",
-                "-y",
-                output_path
-            ]
-        
-        try:
-            subprocess.run(cmd_convert, check=True, capture_output=True)
-        except subprocess.CalledProcessError as e:
-            print(f"转换失败: {e}")
-            return False
-        finally:
-            # 清理临时文件
-            if os.path.exists(wav_path):
-                os.remove(wav_path)
-
-    # 验证时长
+    # 先写 .part 文件，全部完成后再改名，避免中断留下的半截文件被当成已完成而跳过
+    cmd = ["ffmpeg", "-nostdin", "-y", "-i", video_path]
+    for fmt, path in pending:
+        cmd += encode_args(fmt, part_path(path), bitrate)
+
     try:
-        
-        # 验证提取的音频时长是否与视频一致
-        try:
-            video_duration = subprocess.run(
-                ["ffprobe", "-v", "error", "-show_entries", "format=duration",
-                 "-of", "default=noprint_wrappers=1:nokey=1", video_path],
-                capture_output=True,
-                text=True,
-                check=True
-            ).stdout.strip()
-            
-            audio_duration = subprocess.run(
-                ["ffprobe", "-v", "error", "-show_entries", "format=duration",
-                 "-of", "default=noprint_wrappers=1:nokey=1", output_path],
-                capture_output=True,
-                text=True,
-                check=True
-            ).stdout.strip()
-            
-            if video_duration and audio_duration:
-                video_sec = float(video_duration)
-                audio_sec = float(audio_duration)
-                diff = abs(video_sec - audio_sec)
-                
-                if diff > 1.0:  # 如果差异超过1秒，给出警告
-                    print(f"⚠ 警告: 音频时长 ({audio_sec:.2f}s) 与视频时长 ({video_sec:.2f}s) 相差 {diff:.2f} 秒")
-                else:
-                    print(f"✓ 时长验证通过: 视频 {video_sec:.2f}s, 音频 {audio_sec:.2f}s")
-        except Exception as e:
-            print(f"⚠ 无法验证时长: {e}")
-        
-        print(f"✓ 成功提取音频到: {output_path}")
-        return True
+        with io_slot or nullcontext():
+            subprocess.run(cmd, check=True, capture_output=True, text=True)
     except subprocess.CalledProcessError as e:
         print(f"错误: ffmpeg 执行失败")
-        print(f"错误信息: {e.stderr}")
+        print(f"错误信息: {e.stderr.strip()[-2000:]}")
+        for fmt, path in pending:
+            if os.path.exists(part_path(path)):
+                os.remove(part_path(path))
         return False
     except FileNotFoundError:
         print("错误: 未找到 ffmpeg。请确保已安装 ffmpeg 并在 PATH 中。")
         print("安装方法: brew install ffmpeg (macOS)")
         return False
 
+    for fmt, path in pending:
+        os.replace(part_path(path), path)
+
+    # 验证提取的音频时长是否与视频一致
+    for fmt, path in pending:
+        try:
+            audio_sec = output_duration(path, fmt, bitrate)
+            if duration_sec and audio_sec:
+                diff = abs(duration_sec - audio_sec)
+                if diff > 1.0:  # 如果差异超过1秒，给出警告
+                    print(f"⚠ 警告: {os.path.basename(path)} 音频时长 ({audio_sec:.2f}s) 与视频时长 ({duration_sec:.2f}s) 相差 {diff:.2f} 秒")
+                else:
+                    print(f"✓ 时长验证通过: 视频 {duration_sec:.2f}s, 音频 {audio_sec:.2f}s ({fmt})")
+        except Exception as e:
+            print(f"⚠ 无法验证时长: {e}")
+
+        print(f"✓ 成功提取音频到: {path}")
+    return True
+
+def file_device(path):
+    """文件所在的设备号（同一块磁盘/分区相同），无法获取时返回 None"""
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return None
+
+def interleave_by_device(video_files):
+    """按设备轮流排列文件，避免线程池前面的任务都卡在同一块磁盘的名额上"""
+    groups = {}
+    for video_file in video_files:
+        groups.setdefault(file_device(video_file), []).append(video_file)
+    ordered = []
+    queues = list(groups.values())
+    while queues:
+        ordered.extend(queue.pop(0) for queue in queues)
+        queues = [queue for queue in queues if queue]
+    return ordered
+
+def extract_batch(video_files, bitrate, formats, jobs=1, io_slots=None, non_interactive=False):
+    """
+    并行处理多个文件。jobs 为同时处理的文件总数；io_slots 为每块磁盘（按源文件的设备号区分）
+    上同时运行的 ffmpeg 数量上限。解码本身很省 CPU，瓶颈通常在磁盘：
+    剧集分散在多块盘上时可以用较大的 -j 让各块盘都保持忙碌，同时用 io_slots 防止单块机械硬盘被并发读写拖慢。
+    所有文件都在同一块盘上时，io_slots 的效果等同于把 -j 降到 io_slots。
+    返回每个文件的结果列表（与输入顺序一致）。
+    """
+    device_slots = {}
+    slots_lock = threading.Lock()
+
+    def slot_for(video_file):
+        if not io_slots:
+            return None
+        device = file_device(video_file)
+        with slots_lock:
+            if device not in device_slots:
+                device_slots[device] = threading.Semaphore(io_slots)
+            return device_slots[device]
+
+    def run(video_file):
+        stats = {}
+        start = time.perf_counter()
+        ok = extract_audio(video_file, bitrate=bitrate, non_interactive=non_interactive,
+                           formats=formats, io_slot=slot_for(video_file), stats=stats)
+        return {
+            "file": video_file,
+            "ok": ok,
+            "skipped": stats.get("skipped", False),
+            "elapsed": time.perf_counter() - start,
+            "size": os.path.getsize(video_file) if os.path.exists(video_file) else 0,
+            "duration": stats.get("duration"),
+        }
+
+    if jobs <= 1:
+        results = []
+        for video_file in video_files:
+            print(f"\n处理: {os.path.basename(video_file)}")
+            results.append(run(video_file))
+        return results
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        ordered = interleave_by_device(video_files) if io_slots else video_files
+        results = dict(zip(ordered, executor.map(run, ordered)))
+    return [results[video_file] for video_file in video_files]
+
+def print_batch_summary(results, wall_time):
+    print("\n" + "-" * 96)
+    print(f"{'文件名':<36} | {'状态':<6} | {'耗时':>8} | {'大小':>9} | {'吞吐':>10} | {'实时倍率':>8}")
+    print("-" * 96)
+    for r in results:
+        name = os.path.basename(r["file"])
+        size_mb = r["size"] / 1024 ** 2
+        if r["skipped"]:
+            print(f"{name:<36} | {'⏭️ 跳过':<6} |")
+            continue
+        status = "✅ 成功" if r["ok"] else "❌ 失败"
+        throughput = size_mb / r["elapsed"] if r["elapsed"] > 0 else 0
+        speed = f"{r['duration'] / r['elapsed']:>7.0f}x" if r["ok"] and r["duration"] else f"{'-':>8}"
+        print(f"{name:<36} | {status:<6} | {r['elapsed']:>7.1f}s | {size_mb:>7.0f}MB | {throughput:>6.1f}MB/s | {speed}")
+    print("-" * 96)
+
+    processed = [r for r in results if r["ok"] and not r["skipped"]]
+    total_mb = sum(r["size"] for r in processed) / 1024 ** 2
+    print(f"总耗时 {wall_time:.1f}s，处理 {len(processed)} 个文件共 {total_mb:.0f}MB "
+          f"({total_mb / wall_time if wall_time > 0 else 0:.1f}MB/s)")
+
 def main():
     parser = argparse.ArgumentParser(
         description="从 MP4 视频文件中提取 MP3 音频",
@@ -207,19 +262,36 @@ def main():
   
   # 指定比特率
   python extract_audio.py video.mp4 -b 320k
+
+  # 一次解码同时输出 MP3、WAV 和语音识别用的 16kHz 单声道 WAV
+  python extract_audio.py video.mp4 --formats mp3,wav,asr
   
   # 批量处理目录中的所有 MP4 文件
   python extract_audio.py /path/to/videos/
+
+  # 同时处理 8 个文件，但每块磁盘上最多 2 个（剧集分散在多块盘上时）
+  python extract_audio.py /path/to/videos/ -j 8 --io-slots 2
         """
     )
     parser.add_argument("path", help="视频文件路径或包含视频文件的目录")
     parser.add_argument("-o", "--output", help="输出音频文件路径（仅对单个文件有效）")
     parser.add_argument("-b", "--bitrate", default="192k", 
                        help="MP3 比特率 (默认: 192k, 可选: 128k, 192k, 256k, 320k)")
+    parser.add_argument("-f", "--formats", default="wav",
+                       help=f"输出格式，逗号分隔 (默认: wav, 可选: {', '.join(OUTPUT_FORMATS)})；使用 -o 时由扩展名决定")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                       help="目录模式下同时处理的文件数 (默认: 1)")
+    parser.add_argument("--io-slots", type=int,
+                       help="每块磁盘上同时运行的 ffmpeg 数量上限（按源文件所在设备区分；"
+                            "文件都在同一块盘上时等同于 -j 取该值）(默认: 不限制)")
     parser.add_argument("--non-interactive", action="store_true",
                        help="非交互模式，自动覆盖已存在的文件")
     
     args = parser.parse_args()
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    for fmt in formats:
+        if fmt not in OUTPUT_FORMATS:
+            parser.error(f"未知输出格式: {fmt}")
     
     if os.path.isdir(args.path):
         # 批量处理目录中的所有 MP4 文件
@@ -236,12 +308,12 @@ def main():
         video_files.sort()
         print(f"找到 {len(video_files)} 个视频文件")
         
-        success_count = 0
-        for video_file in video_files:
-            print(f"\n处理: {os.path.basename(video_file)}")
-            if extract_audio(video_file, bitrate=args.bitrate, non_interactive=args.non_interactive):
-                success_count += 1
-        
+        batch_start = time.perf_counter()
+        results = extract_batch(video_files, args.bitrate, formats, jobs=args.jobs,
+                                io_slots=args.io_slots, non_interactive=args.non_interactive)
+        print_batch_summary(results, time.perf_counter() - batch_start)
+
+        success_count = sum(1 for r in results if r["ok"])
         print(f"\n完成: 成功处理 {success_count}/{len(video_files)} 个文件")
     else:
         # 处理单个文件
@@ -249,7 +321,7 @@ def main():
             print("错误: 使用 -o 选项时，path 必须是文件而不是目录")
             sys.exit(1)
         
-        success = extract_audio(args.path, args.output, args.bitrate, args.non_interactive)
+        success = extract_audio(args.path, args.output, args.bitrate, args.non_interactive, formats=formats)
         sys.exit(0 if success else 1)
 
 if __name__ == "__main__":
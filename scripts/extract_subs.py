@@ -1,77 +1,439 @@
-import whisper
 import os
+import sys
+import json
 import argparse
+import difflib
 import time
-from datetime import timedelta
-
-def format_timestamp(seconds):
-    td = timedelta(seconds=seconds)
-    total_seconds = int(td.total_seconds())
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    seconds = total_seconds % 60
-    milliseconds = int(td.microseconds / 1000)
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
-
-def extract_subtitles(video_path, model, output_format="srt"):
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Add script directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pcm_cache
+from subtitle import format_cue, format_timestamp, seconds_to_ms
+
+ENGINES = ["openai-whisper", "faster-whisper"]
+COMPUTE_TYPES = ["int8", "int8_float16", "float16", "float32"]
+LANGUAGE = "zh"
+INITIAL_PROMPT = "以下是简体中文的对话。"
+SAMPLE_RATE = pcm_cache.SAMPLE_RATE
+DEFAULT_BATCH_SIZE = 8  # CPU 上更大的批次收益很小，只会增加内存
+MIN_THREADS_PER_WORKER = 2
+MEMORY_HEADROOM = 0.8  # 只使用可用内存的 80%，给解码和系统留余量
+
+# 单个 worker 加载模型并转写时的大致常驻内存 (GB)
+# openai-whisper 在 CPU 上是 float32；faster-whisper int8 约为其 1/3，float16/float32 按比例放大
+MODEL_MEMORY_GB = {
+    "openai-whisper": {"tiny": 1.0, "base": 1.2, "small": 2.0, "medium": 5.0, "large": 10.0, "turbo": 6.0},
+    "faster-whisper": {"tiny": 0.5, "base": 0.6, "small": 1.0, "medium": 2.0, "large": 3.5, "turbo": 2.0},
+}
+COMPUTE_TYPE_MEMORY_SCALE = {"int8": 1.0, "int8_float16": 1.3, "float16": 1.6, "float32": 2.5}
+
+OPENAI_CHUNK_SECONDS = 600  # openai-whisper 按 10 分钟一块转写，每块完成后落盘一次
+
+def speech_timestamps(audio):
+    """Silero VAD (bundled with faster-whisper): list of (start, end) seconds of speech."""
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    chunks = get_speech_timestamps(audio, VadOptions(min_silence_duration_ms=1000, speech_pad_ms=400))
+    return [(c["start"] / SAMPLE_RATE, c["end"] / SAMPLE_RATE) for c in chunks]
+
+def shift_segment(segment, offset):
+    """Moves a segment (and its words) from a sliced-audio timeline back onto the source timeline."""
+    segment = dict(segment)
+    segment["start"] += offset
+    segment["end"] += offset
+    segment["words"] = [
+        {**word, "start": word["start"] + offset, "end": word["end"] + offset}
+        for word in segment.get("words") or []
+    ]
+    return segment
+
+class TranscriptionEngine:
+    """
+    Engine interface: load_audio(path, cache_dir) -> 16 kHz mono int16 memmap from the shared PCM cache,
+    transcribe_stream(audio, offset) -> generator of segments (openai-whisper dict layout,
+    source-timeline seconds) starting at `offset` seconds.
+    Only the part being transcribed is converted to float32.
     """
-    Extracts subtitles using OpenAI Whisper.
-    Accepts a loaded model object to avoid reloading for every file.
+    name = None
+    settings = {}  # model/decoding settings that change the output; a checkpoint only resumes with the same ones
+
+    def load_audio(self, media_path, cache_dir=None):
+        return pcm_cache.load_pcm(media_path, cache_dir)
+
+    def transcribe(self, media_path, cache_dir=None):
+        """Returns (segments, audio_duration_seconds)."""
+        audio = self.load_audio(media_path, cache_dir)
+        return list(self.transcribe_stream(audio)), len(audio) / SAMPLE_RATE
+
+class OpenAIWhisperEngine(TranscriptionEngine):
+    """
+    openai-whisper (PyTorch). compute_type is ignored: on CPU it always runs float32.
+    openai-whisper has no batched decoding; with batch_size set it still runs VAD
+    first and only decodes the speech regions (clip_timestamps keeps the original timeline).
+    model.transcribe only returns when it is done, so the audio is fed in OPENAI_CHUNK_SECONDS chunks.
+    """
+    name = "openai-whisper"
+
+    def __init__(self, model_size, compute_type=None, threads=None, batch_size=None):
+        import whisper
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = whisper.load_model(model_size)
+        self.vad = bool(batch_size)
+        self.settings = {"model": model_size, "compute_type": None, "batch_size": batch_size}
+
+    def _transcribe_chunk(self, chunk):
+        options = {}
+        if self.vad:
+            clips = speech_timestamps(chunk)
+            speech = sum(end - start for start, end in clips)
+            print(f"VAD: {len(clips)} speech regions, {speech:.0f}s of {len(chunk) / SAMPLE_RATE:.0f}s")
+            if not clips:
+                return []
+            options["clip_timestamps"] = [t for clip in clips for t in clip]
+        # Force initial prompt to Simplified Chinese
+        # Enable word_timestamps for more accurate timestamp alignment
+        result = self.model.transcribe(
+            chunk,
+            language=LANGUAGE,
+            initial_prompt=INITIAL_PROMPT,
+            word_timestamps=True,  # 启用词级时间戳，提高时间戳精度
+            verbose=False,
+            **options
+        )
+        return result["segments"]
+
+    def transcribe_stream(self, audio, offset=0.0):
+        total = len(audio) / SAMPLE_RATE
+        while offset < total:
+            chunk_end = min(offset + OPENAI_CHUNK_SECONDS, total)
+            segments = self._transcribe_chunk(pcm_cache.to_float32(pcm_cache.pcm_slice(audio, offset, chunk_end)))
+            segments = [shift_segment(segment, offset) for segment in segments]
+            if chunk_end < total and len(segments) > 1:
+                # 块尾的句子可能被截断：丢弃最后一段，下一块从它的开头重新转写
+                next_offset = segments.pop()["start"]
+            else:
+                next_offset = chunk_end
+            yield from segments
+            offset = max(next_offset, offset + 1)
+
+class FasterWhisperEngine(TranscriptionEngine):
     """
-    print(f"Transcribing {video_path}...")
+    faster-whisper (CTranslate2), supports int8 / int8_float16 quantized inference.
+    With batch_size set it uses BatchedInferencePipeline: VAD drops non-speech, the speech
+    chunks are decoded batch_size at a time and timestamps are mapped back to the source timeline.
+    Segments are yielded as soon as they are decoded.
+    """
+    name = "faster-whisper"
+
+    def __init__(self, model_size, compute_type="int8", threads=None, batch_size=None):
+        from faster_whisper import WhisperModel, BatchedInferencePipeline
+        self.model = WhisperModel(
+            model_size,
+            device="cpu",
+            compute_type=compute_type or "int8",
+            cpu_threads=threads or 0  # 0 = CTranslate2 default
+        )
+        self.batch_size = batch_size
+        self.pipeline = BatchedInferencePipeline(model=self.model) if batch_size else None
+        self.settings = {"model": model_size, "compute_type": compute_type or "int8", "batch_size": batch_size}
+
+    def transcribe_stream(self, audio, offset=0.0):
+        audio = pcm_cache.to_float32(pcm_cache.pcm_slice(audio, offset))
+        options = dict(language=LANGUAGE, initial_prompt=INITIAL_PROMPT, word_timestamps=True)
+        if self.pipeline:
+            segments, info = self.pipeline.transcribe(audio, batch_size=self.batch_size, **options)
+            print(f"VAD: {info.duration_after_vad:.0f}s of speech in {info.duration:.0f}s, batch size {self.batch_size}")
+        else:
+            segments, info = self.model.transcribe(audio, **options)
+        # segments is a generator: decoding happens while we iterate
+        for seg in segments:
+            yield shift_segment({
+                "start": seg.start,
+                "end": seg.end,
+                "text": seg.text,
+                "words": [{"start": w.start, "end": w.end, "word": w.word} for w in (seg.words or [])],
+            }, offset)
+
+def create_engine(name, model_size, compute_type=None, threads=None, batch_size=None):
+    engine_cls = {
+        OpenAIWhisperEngine.name: OpenAIWhisperEngine,
+        FasterWhisperEngine.name: FasterWhisperEngine,
+    }[name]
+    print(f"Loading {name} model: {model_size}" + (f" ({compute_type})" if name == "faster-whisper" else "") + "...")
+    return engine_cls(model_size, compute_type=compute_type, threads=threads, batch_size=batch_size)
+
+def model_memory_gb(engine_name, model_size, compute_type=None):
+    """Approximate resident memory of one worker for the given engine/model."""
+    table = MODEL_MEMORY_GB[engine_name]
+    # large-v2 / large-v3 / distil-large-v3 等都按 large 估算
+    family = next((name for name in sorted(table, key=len, reverse=True) if name in model_size), "large")
+    memory = table[family]
+    if engine_name == "faster-whisper":
+        memory *= COMPUTE_TYPE_MEMORY_SCALE.get(compute_type, 1.0)
+    return memory
+
+def available_memory_gb():
+    """MemAvailable from /proc/meminfo (Linux), falls back to total physical memory."""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024 ** 2
+    except OSError:
+        pass
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 ** 3
+
+def plan_workers(file_count, engine_name, model_size, compute_type=None, workers=None, threads=None):
+    """
+    Chooses (workers, threads_per_worker).
+    workers=None: as many as memory and cores allow, each worker getting at least MIN_THREADS_PER_WORKER threads.
+    threads=None: cores are split evenly between workers.
+    """
+    cores = os.cpu_count() or 1
+    if workers is None:
+        per_worker = model_memory_gb(engine_name, model_size, compute_type)
+        by_memory = int(available_memory_gb() * MEMORY_HEADROOM // per_worker)
+        by_cores = cores // (threads or MIN_THREADS_PER_WORKER)
+        workers = min(by_memory, by_cores)
+    workers = max(1, min(workers, file_count))
+    threads = threads or max(1, cores // workers)
+    return workers, threads
+
+_worker_engine = None
+
+def _init_worker(engine_name, model_size, compute_type, threads, batch_size):
+    # Each worker process loads the model once and reuses it for every episode it gets
+    global _worker_engine
+    _worker_engine = create_engine(engine_name, model_size, compute_type, threads, batch_size)
+
+def _transcribe_in_worker(video_path):
+    return extract_subtitles(video_path, _worker_engine)
+
+def transcribe_parallel(video_files, engine_name, model_size, compute_type, threads, batch_size, workers):
+    """Transcribes episodes in `workers` processes; returns per-episode results in completion order."""
+    results = []
+    total = len(video_files)
+    batch_start = time.time()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(engine_name, model_size, compute_type, threads, batch_size)
+    ) as executor:
+        futures = {executor.submit(_transcribe_in_worker, path): path for path in video_files}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ {os.path.basename(path)} failed: {e}")
+                result = {"file": path, "error": str(e)}
+            results.append(result)
+            elapsed = time.time() - batch_start
+            print(f"[{len(results)}/{total}] {os.path.basename(path)} done, elapsed {elapsed/60:.1f}m")
+    return results
+
+def print_batch_summary(results, wall_time):
+    print("\n" + "-" * 80)
+    print(f"{'Episode':<40} | {'Audio':>7} | {'Time':>8} | {'RTF':>6}")
+    print("-" * 80)
+    for r in sorted(results, key=lambda r: r["file"]):
+        name = os.path.basename(r["file"])
+        if "error" in r:
+            print(f"{name:<40} | failed: {r['error']}")
+            continue
+        print(f"{name:<40} | {r['audio_duration']/60:>6.1f}m | {r['elapsed']:>7.1f}s | {r['rtf']:>6.3f}")
+    print("-" * 80)
+    done = [r for r in results if "error" not in r]
+    audio_total = sum(r["audio_duration"] for r in done)
+    print(f"{len(done)}/{len(results)} episodes, {audio_total/3600:.2f}h of audio in {wall_time/60:.1f}m "
+          f"(overall RTF {wall_time / audio_total if audio_total else 0:.3f})")
+
+def segment_bounds(segment):
+    # 如果启用了word_timestamps，使用词级时间戳来优化segment时间戳
+    # 使用第一个词的开始时间和最后一个词的结束时间，提高精度
+    if "words" in segment and len(segment["words"]) > 0:
+        words = segment["words"]
+        return words[0]["start"], words[-1]["end"]
+    return segment["start"], segment["end"]
+
+def format_entry(index, segment, output_format="srt"):
+    if output_format != "srt":
+        return segment["text"]
+    start, end = segment_bounds(segment)
+    return format_cue(index, seconds_to_ms(start), seconds_to_ms(end), segment["text"].strip())
+
+def write_srt(segments, output_file):
+    with open(output_file, "w", encoding="utf-8") as f:
+        for i, segment in enumerate(segments):
+            f.write(format_entry(i + 1, segment))
+
+def write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def load_checkpoint(checkpoint_path, partial_path, source_stat, engine_name, settings=None):
+    """
+    Returns the checkpoint if it belongs to this source file, engine and engine settings
+    (model, compute type, batching) and its partial output exists.
+    """
+    if not (os.path.exists(checkpoint_path) and os.path.exists(partial_path)):
+        return None
+    try:
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (checkpoint.get("source_size"), checkpoint.get("source_mtime"), checkpoint.get("engine"),
+            checkpoint.get("settings")) != (source_stat.st_size, source_stat.st_mtime, engine_name, settings or {}):
+        print("Checkpoint does not match the current source/engine/settings, starting over")
+        return None
+    if os.path.getsize(partial_path) < checkpoint["bytes"]:
+        return None
+    return checkpoint
+
+def extract_subtitles(video_path, engine, output_format="srt"):
+    """
+    Extracts subtitles with the given transcription engine.
+    Accepts a loaded engine to avoid reloading the model for every file.
+    Segments are streamed to <name>.<fmt>.partial as they are produced and the audio offset
+    reached is checkpointed to <name>.<fmt>.checkpoint.json after every segment.
+    An interrupted run resumes from the last checkpoint; the final file only appears
+    (via an atomic rename) once the whole episode is transcribed.
+    """
+    print(f"Transcribing {video_path} with {engine.name}...")
     start_time = time.time()
-    
-    # Force initial prompt to Simplified Chinese
-    # Enable word_timestamps for more accurate timestamp alignment
-    result = model.transcribe(
-        video_path, 
-        language="zh", 
-        initial_prompt="以下是简体中文的对话。",
-        word_timestamps=True,  # 启用词级时间戳，提高时间戳精度
-        verbose=False 
-    )
-    
+
     base_name = os.path.splitext(video_path)[0]
     output_file = f"{base_name}.{output_format}"
-    
-    with open(output_file, "w", encoding="utf-8") as f:
-        if output_format == "srt":
-            for i, segment in enumerate(result["segments"]):
-                # 如果启用了word_timestamps，使用词级时间戳来优化segment时间戳
-                # 使用第一个词的开始时间和最后一个词的结束时间，提高精度
-                if "words" in segment and len(segment["words"]) > 0:
-                    words = segment["words"]
-                    start = format_timestamp(words[0]["start"])
-                    end = format_timestamp(words[-1]["end"])
-                else:
-                    start = format_timestamp(segment["start"])
-                    end = format_timestamp(segment["end"])
-                
-                text = segment["text"].strip()
-                f.write(f"{i+1}\n")
-                f.write(f"{start} --> {end}\n")
-                f.write(f"{text}\n\n")
-        else:
-            f.write(result["text"])
-            
+    partial_path = f"{output_file}.partial"
+    checkpoint_path = f"{output_file}.checkpoint.json"
+    source_stat = os.stat(video_path)
+
+    checkpoint = load_checkpoint(checkpoint_path, partial_path, source_stat, engine.name, engine.settings)
+    offset, count, written = 0.0, 0, 0
+    if checkpoint:
+        offset, count, written = checkpoint["offset"], checkpoint["segments"], checkpoint["bytes"]
+        print(f"Resuming from {format_timestamp(offset)} ({count} segments already written)")
+
+    audio = engine.load_audio(video_path)
+    audio_duration = len(audio) / SAMPLE_RATE
+
+    def save_checkpoint():
+        write_json_atomic(checkpoint_path, {
+            "source_size": source_stat.st_size,
+            "source_mtime": source_stat.st_mtime,
+            "engine": engine.name,
+            "settings": engine.settings,
+            "offset": offset,
+            "segments": count,
+            "bytes": written,
+        })
+
+    with open(partial_path, "r+b" if checkpoint else "wb") as f:
+        # 丢弃上次中断时写了一半、还没记录进检查点的内容
+        f.truncate(written)
+        f.seek(written)
+        # 先写一次检查点：没有任何语音（静音、纯音乐或 VAD 没检测到人声）时也有检查点可以清理
+        save_checkpoint()
+        for segment in engine.transcribe_stream(audio, offset):
+            count += 1
+            f.write(format_entry(count, segment, output_format).encode("utf-8"))
+            f.flush()
+            written = f.tell()
+            offset = segment["end"]
+            save_checkpoint()
+        os.fsync(f.fileno())
+
+    os.replace(partial_path, output_file)
+    os.remove(checkpoint_path)
+
     end_time = time.time()
     duration = end_time - start_time
+    processed = audio_duration - (checkpoint["offset"] if checkpoint else 0)
+    rtf = duration / processed if processed > 0 else 0
     print(f"Subtitles saved to {output_file}")
-    print(f"Time taken: {duration:.2f} seconds ({duration/60:.2f} minutes)")
-    
+    print(f"Time taken: {duration:.2f} seconds ({duration/60:.2f} minutes), RTF {rtf:.3f}")
+
     # Log to a separate file for batch tracking
     with open("processing_log.txt", "a", encoding="utf-8") as log:
-        log.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {video_path}: {duration:.2f}s ({duration/60:.2f}m)\n")
+        log.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {video_path}: {duration:.2f}s ({duration/60:.2f}m) [{engine.name}, RTF {rtf:.3f}]\n")
+
+    return {"file": video_path, "elapsed": duration, "audio_duration": processed, "rtf": rtf}
+
+def compare_engines(video_path, model_size, compute_type, threads, batch_size=None):
+    """
+    Runs every engine on the same file and reports the realtime factor
+    (processing time / audio duration, lower is faster) and the segment-text diff.
+    Nothing is written next to the video: the decoded PCM goes to a temporary
+    cache directory shared by both engines and removed afterwards.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="pcm_compare_") as cache_dir:
+        for name in ENGINES:
+            load_start = time.time()
+            engine = create_engine(name, model_size, compute_type, threads, batch_size)
+            load_time = time.time() - load_start
+
+            print(f"Transcribing {video_path} with {name}...")
+            start_time = time.time()
+            segments, audio_duration = engine.transcribe(video_path, cache_dir)
+            elapsed = time.time() - start_time
+            results[name] = {
+                "segments": segments,
+                "load_time": load_time,
+                "elapsed": elapsed,
+                "rtf": elapsed / audio_duration if audio_duration else 0,
+            }
+            del engine
+
+    print("\n" + "-" * 70)
+    print(f"{'Engine':<16} | {'Load':>7} | {'Transcribe':>10} | {'RTF':>6} | {'Segments':>8}")
+    print("-" * 70)
+    for name, r in results.items():
+        print(f"{name:<16} | {r['load_time']:>6.1f}s | {r['elapsed']:>9.1f}s | {r['rtf']:>6.3f} | {len(r['segments']):>8}")
+    print("-" * 70)
+
+    base_name, other_name = ENGINES
+    base_texts = [s["text"].strip() for s in results[base_name]["segments"]]
+    other_texts = [s["text"].strip() for s in results[other_name]["segments"]]
+    similarity = difflib.SequenceMatcher(None, "".join(base_texts), "".join(other_texts)).ratio()
+    print(f"Text similarity ({base_name} vs {other_name}): {similarity:.1%}")
+
+    diff = list(difflib.unified_diff(base_texts, other_texts, fromfile=base_name, tofile=other_name, lineterm=""))
+    if diff:
+        print("\n".join(diff))
+    else:
+        print("Segment texts are identical.")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Extract subtitles from video")
     parser.add_argument("path", help="Path to video file or directory")
     parser.add_argument("--model", default="medium", help="Whisper model size (tiny, base, small, medium, large)")
+    parser.add_argument("--engine", choices=ENGINES, default="openai-whisper", help="Transcription engine (default: openai-whisper)")
+    parser.add_argument("--compute-type", choices=COMPUTE_TYPES, default="int8", help="faster-whisper compute type (default: int8)")
+    parser.add_argument("--threads", type=int, help="CPU threads used for inference (default: engine default)")
+    parser.add_argument("--batched", action="store_true",
+                        help="Run VAD first, skip non-speech and decode speech chunks in batches (faster-whisper)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Speech chunks decoded per batch in --batched mode (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--workers", default="1",
+                        help="Parallel transcription workers for directory mode: a number or 'auto' "
+                             "(sized from model memory, available RAM and cores). Default: 1")
+    parser.add_argument("--compare", action="store_true", help="Run all engines on one file and report RTF and text diff")
     args = parser.parse_args()
+    batch_size = args.batch_size if args.batched else None
 
-    # Load model ONCE outside the loop
-    print(f"Loading Whisper model: {args.model}...")
-    model = whisper.load_model(args.model)
+    if args.compare:
+        if os.path.isdir(args.path):
+            parser.error("--compare needs a single video file")
+        compare_engines(args.path, args.model, args.compute_type, args.threads, batch_size)
+        raise SystemExit(0)
 
     if os.path.isdir(args.path):
         # Collect all video files first
@@ -80,18 +442,41 @@ if __name__ == "__main__":
             for file in files:
                 if file.lower().endswith(('.mp4', '.mkv', '.avi', '.mov')):
                     video_files.append(os.path.join(root, file))
-        
+
         # Sort files naturally (01, 02, ..., 10, 11)
         video_files.sort()
-        
+
+        pending = []
         for filepath in video_files:
             base_name = os.path.splitext(filepath)[0]
             expected_output = f"{base_name}.srt"
-            
+
             if os.path.exists(expected_output):
                 print(f"Skipping {os.path.basename(filepath)} (SRT already exists)")
                 continue
-                
-            extract_subtitles(filepath, model)
+            pending.append(filepath)
+
+        if not pending:
+            raise SystemExit(0)
+
+        workers, threads = plan_workers(
+            len(pending), args.engine, args.model, args.compute_type,
+            workers=None if args.workers == "auto" else int(args.workers),
+            threads=args.threads
+        )
+        batch_start = time.time()
+        if workers > 1:
+            print(f"Transcribing {len(pending)} episodes with {workers} workers x {threads} threads "
+                  f"(~{model_memory_gb(args.engine, args.model, args.compute_type):.1f}GB per worker, "
+                  f"{available_memory_gb():.1f}GB available)")
+            results = transcribe_parallel(pending, args.engine, args.model, args.compute_type, threads, batch_size, workers)
+        else:
+            # Load model ONCE outside the loop
+            engine = create_engine(args.engine, args.model, args.compute_type, args.threads, batch_size)
+            results = []
+            for filepath in pending:
+                results.append(extract_subtitles(filepath, engine))
+        print_batch_summary(results, time.time() - batch_start)
     else:
-        extract_subtitles(args.path, model)
+        engine = create_engine(args.engine, args.model, args.compute_type, args.threads, batch_size)
+        extract_subtitles(args.path, engine)
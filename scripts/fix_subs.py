@@ -1,8 +1,20 @@
 import os
 import re
+import sys
+import csv
 import json
+import time
 import argparse
-from rapidfuzz import process, fuzz
+import numpy as np
+from functools import lru_cache
+from rapidfuzz import process
+from rapidfuzz.distance import Hamming
+
+# Add script directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import aho_corasick
+from subtitle import SubtitleTrack
 
 def load_entities(json_path):
     with open(json_path, 'r', encoding='utf-8') as f:
@@ -18,66 +30,312 @@ def load_entities(json_path):
     
     return all_entities, corrections
 
-def fix_subtitle_text(text, entities, corrections, threshold=85):
+def automaton_cache_path(json_path):
+    # The compiled automaton lives next to the entities JSON, e.g. entities.json -> entities.ac.pickle
+    return f"{os.path.splitext(json_path)[0]}.ac.pickle"
+
+def build_corrector(corrections, json_path=None):
+    """Compiles the common_errors map into an Aho-Corasick automaton (cached on disk next to json_path)."""
+    return aho_corasick.load_or_build(corrections, automaton_cache_path(json_path) if json_path else None)
+
+# Fuzzy matching compares pinyin position by position: same character or same pinyin 1.0, same pinyin in
+# another tone 0.8, a common ASR/accent slip (z/zh, c/ch, s/sh, n/l, -n/-ng) 0.6, anything else 0; a
+# substitution common_errors already makes counts as the same character. The score is the mean in percent.
+# Only exact homophones (100, "童志" -> "佟志", "留厂长" -> "刘厂长") are applied by default; tone and
+# near-sound slips ("杨瓜妇" 93, "牛厂长" 87) and one unrelated character (3-char 67) go to the review report.
+FUZZY_THRESHOLD = 100
+REVIEW_THRESHOLD = 60
+TONE_SCORE = 0.8
+NEAR_SOUND_SCORE = 0.6
+MIN_LEXICON_WORD = 4  # dictionary words up to this length (at least) are used for the word-boundary check
+CJK_RUN = re.compile(r'[\u4e00-\u9fa5]+')
+
+def toneless(syllable):
+    return syllable.rstrip("012345")
+
+def near_sound(syllable):
+    """Folds the initials and finals ASR and regional accents mix up: zh/z, ch/c, sh/s, n/l, -ng/-n."""
+    s = toneless(syllable)
+    if s[:2] in ("zh", "ch", "sh"):
+        s = s[0] + s[2:]
+    elif s[:1] == "n":
+        s = "l" + s[1:]
+    if s.endswith("ng") and not s.endswith("ong"):
+        s = s[:-1]
+    return s
+
+@lru_cache(maxsize=None)
+def char_reading(char):
+    """Default reading of one character, e.g. "zhi4" (pypinyin is only imported when --fuzzy is used)."""
+    from pypinyin import Style, pinyin
+    return pinyin(char, style=Style.TONE3, neutral_tone_with_five=True)[0][0]
+
+def load_lexicon(max_len):
+    """Words of 2..max_len characters from jieba's dictionary."""
+    import jieba
+    with jieba.get_dict_file() as f:
+        text = f.read().decode("utf-8")
+    return set(re.findall(rf"^(\S{{2,{max_len}}}) ", text, re.M))
+
+def learned_confusions(corrections):
+    """Characters common_errors already swaps at the same position ("童志" -> "佟志" gives 童 -> 佟)."""
+    mapping = {}
+    for wrong, right in corrections.items():
+        if len(wrong) == len(right):
+            for a, b in zip(wrong, right):
+                if a != b:
+                    mapping.setdefault(a, b)
+    return mapping
+
+class EntityIndex:
     """
-    1. Apply explicit corrections map.
-    2. Fuzzy match words against entity list.
+    Entities encoded as pinyin key strings for batched scoring: one code point per syllable at three
+    levels (with tone, toneless, near_sound), so rapidfuzz's Hamming similarity on each level counts
+    the positions that match at that level. Polyphones in names get a second key from the phrase reading.
+    Also holds jieba's word list: real words are never auto-corrected and candidates must sit at word boundaries.
     """
-    # 1. Explicit corrections
-    for error, correct in corrections.items():
-        text = text.replace(error, correct)
-    
-    # 2. Heuristic/Fuzzy correction (Conservative)
-    # This part is tricky because naive fuzzy replacement can break sentences.
-    # Strategy: Scan for 2-3 character words that might be entities.
-    
-    # Simple regex to find potential names (2-3 chinese chars)
-    # This is a heuristic and might need tuning.
-    # candidates = re.findall(r'[\u4e00-\u9fa5]{2,3}', text)
-    
-    # for candidate in candidates:
-    #     match, score, _ = process.extractOne(candidate, entities, scorer=fuzz.ratio)
-    #     if score >= threshold and candidate != match:
-    #         # Only replace if the context suggests it's a name? 
-    #         # For now, let's just stick to the explicit map which is safer.
-    #         # text = text.replace(candidate, match)
-    #         pass
-            
-    return text
-
-def process_srt(file_path, entities, corrections):
-    output_lines = []
-    
-    with open(file_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+
+    def __init__(self, entities, corrections=None):
+        self.entities = sorted({e for e in entities if len(e) >= 2})
+        self.entity_set = set(self.entities)
+        self.lengths = sorted({len(e) for e in self.entities})
+        self.max_word = max(self.lengths + [MIN_LEXICON_WORD])
+        self.lexicon = load_lexicon(self.max_word)
+        self.confusions = learned_confusions(corrections or {})
+        self.syllable_codes = {}
+        self.char_codes_cache = {}
+        self.targets = {}  # length -> [(entity, tone, plain, near)]
+        from pypinyin import Style, lazy_pinyin
+        for entity in self.entities:
+            keys = {self.encode_syllables([char_reading(char) for char in entity])}
+            keys.add(self.encode_syllables(lazy_pinyin(entity, style=Style.TONE3, neutral_tone_with_five=True)))
+            for key in sorted(keys):
+                self.targets.setdefault(len(entity), []).append((entity,) + key)
+
+    def code(self, syllable):
+        return self.syllable_codes.setdefault(syllable, chr(0xE000 + len(self.syllable_codes)))
+
+    def encode_syllables(self, syllables):
+        return tuple("".join(self.code(level(s)) for s in syllables) for level in (str, toneless, near_sound))
+
+    def char_codes(self, char):
+        codes = self.char_codes_cache.get(char)
+        if codes is None:
+            # A learned confusion sounds exactly like the character it should have been
+            syllable = char_reading(self.confusions.get(char, char))
+            codes = self.char_codes_cache[char] = tuple(
+                self.code(level(syllable)) for level in (str, toneless, near_sound))
+        return codes
+
+    def encode(self, text):
+        """(tone, toneless, near_sound) key strings of a line, one code per character; non-CJK characters stay as they are."""
+        columns = [self.char_codes(char) if '\u4e00' <= char <= '\u9fa5' else (char, char, char) for char in text]
+        return tuple("".join(column[k] for column in columns) for k in range(3))
+
+    def word_interior(self, text):
+        """Offsets strictly inside a dictionary word of the line; a candidate must not start or end at one."""
+        inside = set()
+        for i in range(len(text) - 1):
+            for length in range(2, min(self.max_word, len(text) - i) + 1):
+                if text[i:i + length] in self.lexicon:
+                    inside.update(range(i + 1, i + length))
+        return inside
+
+    def slip_kinds(self, candidate, key):
+        """Kinds of slip between a candidate and one entity key, for the review report."""
+        entity, tone, plain, near = key
+        codes = self.encode(candidate)
+        kinds = set()
+        for k, (char, target) in enumerate(zip(candidate, entity)):
+            if char == target:
+                continue
+            if self.confusions.get(char) == target:
+                kinds.add("learned")
+            elif codes[0][k] == tone[k]:
+                kinds.add("homophone")
+            elif codes[1][k] == plain[k]:
+                kinds.add("tone")
+            elif codes[2][k] == near[k]:
+                kinds.add("near sound")
+            else:
+                kinds.add("different")
+        return " ".join(sorted(kinds))
+
+def fuzzy_corrections(texts, index, threshold=FUZZY_THRESHOLD, review_threshold=REVIEW_THRESHOLD):
+    """
+    Finds sound-alike misspellings of entities across all lines of a file.
+    1. Every CJK window with the length of some entity that does not start or end inside a dictionary
+       word becomes a candidate ("他往墙上一靠" never yields "往墙", which would cut "墙上").
+    2. Candidates are scored against all entities of their length with three rapidfuzz.process.cdist
+       calls (Hamming similarity of the tone / toneless / near_sound key strings).
+    3. A candidate that is a dictionary word itself ("同志" for "佟志") is never applied, only reported.
+    Returns ({candidate: entity} to apply, review rows for the report, word interiors of every line).
+    """
+    counts = {}
+    examples = {}
+    keys = {}
+    interiors = []
+    for line_no, text in enumerate(texts):
+        interior = index.word_interior(text)
+        interiors.append(interior)
+        encoded = None
+        for run in CJK_RUN.finditer(text):
+            for length in index.lengths:
+                for i in range(run.start(), run.end() - length + 1):
+                    if i in interior or i + length in interior:
+                        continue
+                    window = text[i:i + length]
+                    if window in index.entity_set:
+                        continue
+                    if window not in counts:
+                        encoded = encoded or index.encode(text)
+                        counts[window] = 0
+                        examples[window] = line_no
+                        keys[window] = tuple(level[i:i + length] for level in encoded)
+                    counts[window] += 1
+
+    hits = {}
+    for length, targets in index.targets.items():
+        candidates = [window for window in keys if len(window) == length]
+        if not candidates:
+            continue
+        tone, plain, near = (
+            process.cdist([keys[w][k] for w in candidates], [t[k + 1] for t in targets],
+                          scorer=Hamming.similarity, dtype=np.int32, workers=-1)
+            for k in range(3)
+        )
+        scores = np.rint(100 * (tone + TONE_SCORE * (plain - tone) + NEAR_SOUND_SCORE * (near - plain)) / length)
+        for i, j in zip(*np.nonzero(scores >= review_threshold)):
+            found = hits.setdefault(candidates[i], {})
+            entity = targets[j][0]
+            if int(scores[i, j]) > found.get(entity, (-1,))[0]:
+                found[entity] = (int(scores[i, j]), targets[j])
+
+    accepted = {}
+    review = []
+    for candidate, found in hits.items():
+        scored = sorted(((score, entity, key) for entity, (score, key) in found.items()), key=lambda s: (-s[0], s[1]))
+        best_score, best_entity, best_key = scored[0]
+        reason = index.slip_kinds(candidate, best_key)
+        if len(scored) > 1 and scored[1][0] == best_score:
+            action = "ambiguous"
+        elif best_score < threshold:
+            action = "review"
+        elif candidate in index.lexicon:
+            action = "review"
+            reason = f"real word, {reason}"
+        else:
+            action = "applied"
+            accepted[candidate] = best_entity
+        review.append({
+            "candidate": candidate,
+            "suggestion": best_entity,
+            "score": best_score,
+            "count": counts[candidate],
+            "action": action,
+            "reason": reason,
+            "alternatives": " ".join(entity for _, entity, _ in scored[1:]),
+            "example": texts[examples[candidate]],
+        })
+    review.sort(key=lambda row: (row["action"] != "applied", -row["score"], -row["count"]))
+    return accepted, review, interiors
+
+def apply_by_priority(text, automaton, priority, interior=()):
+    """
+    Replaces matches of `automaton` in text; when matches overlap, the one with the
+    higher priority (score, then frequency in the file) wins instead of the leftmost.
+    Matches that start or end at an offset in `interior` (inside a dictionary word) are skipped.
+    Returns (text, replacement_count).
+    """
+    matches = {start: length for start, length in automaton.longest_by_start(text).items()
+               if start not in interior and start + length not in interior}
+    if not matches:
+        return text, 0
+    chosen = []
+    taken = [False] * len(text)
+    for start, length in sorted(matches.items(), key=lambda m: priority[text[m[0]:m[0] + m[1]]], reverse=True):
+        if not any(taken[start:start + length]):
+            chosen.append((start, length))
+            taken[start:start + length] = [True] * length
+    pieces = []
+    pos = 0
+    for start, length in sorted(chosen):
+        pieces.append(text[pos:start])
+        pieces.append(automaton.replacements[text[start:start + length]])
+        pos = start + length
+    pieces.append(text[pos:])
+    return "".join(pieces), len(chosen)
+
+def write_review_report(rows, path):
+    columns = ["action", "candidate", "suggestion", "score", "count", "reason", "alternatives", "example"]
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def process_srt(file_path, corrector, entity_index=None, threshold=FUZZY_THRESHOLD):
+    track = SubtitleTrack.load(file_path)
         
     print(f"Fixing {file_path}...")
+    replacement_count = 0
+    start_time = time.perf_counter()
+
+    # Subtitle text lines only: the parser already separates indexes and timestamps
+    positions = []
+    originals = []
+    for cue, line_no, line in track.text_lines():
+        positions.append((cue, line_no))
+        originals.append(line.strip())
+
+    # 1. Explicit corrections, line by line (one leftmost-longest scan, independent of map order)
+    fixed_texts = []
+    for original in originals:
+        fixed, replacements = corrector.replace(original)
+        replacement_count += replacements
+        fixed_texts.append(fixed)
+
+    # 2. Fuzzy entity correction over the whole file
+    fuzzy_count = 0
+    if entity_index is not None:
+        accepted, review, interiors = fuzzy_corrections(fixed_texts, entity_index, threshold)
+        if accepted:
+            fuzzy_corrector = aho_corasick.AhoCorasick(accepted)
+            priority = {row["candidate"]: (row["score"], row["count"]) for row in review if row["action"] == "applied"}
+            for k, text in enumerate(fixed_texts):
+                fixed_texts[k], replacements = apply_by_priority(text, fuzzy_corrector, priority, interiors[k])
+                fuzzy_count += replacements
+        if review:
+            report_path = file_path.replace(".srt", "_fuzzy_review.csv")
+            write_review_report(review, report_path)
+            print(f"Fuzzy: {len(accepted)} spellings applied ({fuzzy_count} replacements), "
+                  f"{len(review) - len(accepted)} left for review -> {report_path}")
+
+    cue_lines = [text.split("\n") for text in track.texts]
     fixed_count = 0
-    
-    for line in lines:
-        # SRT text lines usually don't start with numbers (index) or contain '-->' (timestamp)
-        # Note: This is a simple check; empty lines are also skipped.
-        clean_line = line.strip()
-        if not clean_line.isdigit() and '-->' not in clean_line and clean_line:
-            original = clean_line
-            fixed = fix_subtitle_text(original, entities, corrections)
-            if fixed != original:
-                line = line.replace(original, fixed)
-                fixed_count += 1
-                # print(f"  Fixed: {original} -> {fixed}")
-        
-        output_lines.append(line)
-        
+    for (cue, line_no), original, fixed in zip(positions, originals, fixed_texts):
+        if fixed != original:
+            cue_lines[cue][line_no] = cue_lines[cue][line_no].replace(original, fixed)
+            fixed_count += 1
+    track.texts = ["\n".join(lines) for lines in cue_lines]
+
+    elapsed = time.perf_counter() - start_time
+    replacement_count += fuzzy_count
+    rate = replacement_count / elapsed if elapsed > 0 else 0
     output_path = file_path.replace(".srt", "_fixed.srt")
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.writelines(output_lines)
+    track.save(output_path)
         
-    print(f"Saved fixed subtitles to {output_path} (Fixed {fixed_count} lines)")
+    print(f"Saved fixed subtitles to {output_path} (Fixed {fixed_count} lines, "
+          f"{replacement_count} replacements in {elapsed * 1000:.1f}ms, {rate:,.0f} replacements/sec)")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Fix Whisper subtitles using entity knowledge base")
     parser.add_argument("path", help="Path to SRT file or directory")
     parser.add_argument("--entities", default="entities.json", help="Path to entities JSON file")
+    parser.add_argument("--fuzzy", action="store_true",
+                        help="Also correct near-miss spellings of entities (writes <name>_fuzzy_review.csv)")
+    parser.add_argument("--threshold", type=int, default=FUZZY_THRESHOLD,
+                        help=f"Minimum sound-alike score (0-100) to apply a fuzzy correction; 100 applies exact homophones only, "
+                             f"90 also one-tone slips in 2-character names (default: {FUZZY_THRESHOLD})")
     
     args = parser.parse_args()
     
@@ -86,18 +344,25 @@ if __name__ == "__main__":
         exit(1)
         
     entities, corrections = load_entities(args.entities)
+    build_start = time.perf_counter()
+    corrector = build_corrector(corrections, args.entities)
+    print(f"Loaded {len(corrections)} corrections ({(time.perf_counter() - build_start) * 1000:.1f}ms)")
+    entity_index = EntityIndex(entities, corrections) if args.fuzzy else None
     
-    # Add dependency check for rapidfuzz
-    try:
-        import rapidfuzz
-    except ImportError:
-        print("Please install rapidfuzz: uv add rapidfuzz")
-        exit(1)
-
     if os.path.isdir(args.path):
+        failed = []
         for root, dirs, files in os.walk(args.path):
             for file in files:
                 if file.endswith(".srt") and not file.endswith("_fixed.srt") and not file.endswith("_ocr.srt"):
-                    process_srt(os.path.join(root, file), entities, corrections)
+                    file_path = os.path.join(root, file)
+                    try:
+                        process_srt(file_path, corrector, entity_index, args.threshold)
+                    except (OSError, ValueError) as e:
+                        # One broken file should not stop the rest of the directory
+                        print(f"❌ {file} failed: {e}")
+                        failed.append(file_path)
+        if failed:
+            print(f"{len(failed)} files failed: {', '.join(failed)}")
+            exit(1)
     else:
-        process_srt(args.path, entities, corrections)
+        process_srt(args.path, corrector, entity_index, args.threshold)
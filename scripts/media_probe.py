@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+共享的媒体信息探测与缓存
+每个文件只运行一次 ffprobe（JSON 输出 format + streams，外加开头一段视频包用于估算关键帧间隔），
+结果按 (绝对路径, 文件大小, mtime) 缓存在磁盘上；文件没变时直接从内存返回，不再启动子进程。
+新的探测结果先记在内存里，进程退出时（或调用 flush()）一次性合并写回，不会每探测一个文件就重写整个缓存。
+缓存默认位于 ~/.cache/yyy-grandma/media_probe.json，可用环境变量 MEDIA_PROBE_CACHE 指定。
+"""
+
+import os
+import sys
+import json
+import atexit
+import argparse
+import threading
+import subprocess
+from dataclasses import dataclass, asdict, fields
+from typing import Optional
+
+CACHE_PATH = os.environ.get("MEDIA_PROBE_CACHE") or os.path.join(
+    os.path.expanduser("~"), ".cache", "yyy-grandma", "media_probe.json"
+)
+CACHE_VERSION = 1
+KEYFRAME_SCAN_SECONDS = 30  # 只读取开头 30 秒的包来估算关键帧间隔
+
+@dataclass
+class MediaInfo:
+    """一个媒体文件的探测结果，时长单位为秒"""
+    path: str
+    size: int
+    duration: Optional[float] = None  # 容器 (format) 时长
+    format_name: str = ""
+    bit_rate: Optional[int] = None
+    video_codec: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    fps: Optional[float] = None
+    keyframe_interval: Optional[float] = None
+    video_duration: Optional[float] = None  # 视频流时长
+    audio_codec: Optional[str] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    audio_duration: Optional[float] = None  # 第一条音频流的时长
+
+    @property
+    def resolution(self):
+        return f"{self.width}x{self.height}" if self.width and self.height else None
+
+_lock = threading.Lock()
+_cache = None
+_paths = {}  # 绝对路径 -> 当前缓存键，用于 O(1) 清理同一文件的旧条目
+_dirty = {}  # 本进程新增、尚未写回磁盘的条目
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+def _read_entries():
+    try:
+        with open(CACHE_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == CACHE_VERSION:
+            return data.get("entries", {})
+    except (OSError, ValueError):
+        pass
+    return {}
+
+def _load_cache():
+    global _cache
+    if _cache is None:
+        _cache = _read_entries()
+        for key in _cache:
+            _paths[key.rsplit("|", 2)[0]] = key
+    return _cache
+
+def _save_cache(new_entries):
+    """与磁盘上的缓存合并后原子写回，多个进程同时使用也不会互相覆盖掉对方的结果"""
+    entries = _read_entries()
+    # 同一路径的旧条目（文件已被修改）一并清理
+    new_paths = {key.rsplit("|", 2)[0] for key in new_entries}
+    entries = {key: entry for key, entry in entries.items() if key.rsplit("|", 2)[0] not in new_paths}
+    entries.update(new_entries)
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    tmp_path = f"{CACHE_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": CACHE_VERSION, "entries": entries}, f, ensure_ascii=False)
+    os.replace(tmp_path, CACHE_PATH)
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _rate(value):
+    """"30000/1001" -> 29.97；"0/0" 等无效值返回 None"""
+    try:
+        num, den = value.split("/")
+        return float(num) / float(den) if float(den) else None
+    except (AttributeError, ValueError):
+        return None
+
+def _stream_duration(stream):
+    duration = _float(stream.get("duration"))
+    if duration is None:
+        # MKV 等容器只在标签里记录流时长，格式为 HH:MM:SS.nnnnnnnnn
+        tag = (stream.get("tags") or {}).get("DURATION")
+        if tag:
+            try:
+                h, m, sec = tag.split(":")
+                duration = int(h) * 3600 + int(m) * 60 + float(sec)
+            except ValueError:
+                pass
+    return duration
+
+def _keyframe_interval(packets, stream_index):
+    times = [
+        _float(p.get("pts_time")) for p in packets
+        if p.get("stream_index") == stream_index and "K" in p.get("flags", "")
+    ]
+    times = sorted(t for t in times if t is not None)
+    if len(times) < 2:
+        return None
+    return (times[-1] - times[0]) / (len(times) - 1)
+
+def run_ffprobe(path):
+    cmd = [
+        "ffprobe", "-v", "error", "-print_format", "json",
+        "-show_format", "-show_streams",
+        "-show_entries", "packet=stream_index,pts_time,flags",
+        "-read_intervals", f"%+{KEYFRAME_SCAN_SECONDS}",
+        path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+def parse_probe(path, size, data):
+    fmt = data.get("format", {})
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"
+                  and not (s.get("disposition") or {}).get("attached_pic")), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+    info = MediaInfo(
+        path=os.path.abspath(path),
+        size=size,
+        duration=_float(fmt.get("duration")),
+        format_name=fmt.get("format_name", ""),
+        bit_rate=int(fmt["bit_rate"]) if str(fmt.get("bit_rate", "")).isdigit() else None,
+    )
+    if video:
+        info.video_codec = video.get("codec_name")
+        info.width = video.get("width")
+        info.height = video.get("height")
+        info.fps = _rate(video.get("avg_frame_rate")) or _rate(video.get("r_frame_rate"))
+        info.video_duration = _stream_duration(video)
+        info.keyframe_interval = _keyframe_interval(data.get("packets", []), video.get("index"))
+    if audio:
+        info.audio_codec = audio.get("codec_name")
+        info.sample_rate = int(audio["sample_rate"]) if audio.get("sample_rate") else None
+        info.channels = audio.get("channels")
+        info.audio_duration = _stream_duration(audio)
+    return info
+
+def probe(path, refresh=False):
+    """
+    返回文件的 MediaInfo，文件不存在或 ffprobe 失败时返回 None。
+    命中缓存时只有一次 os.stat 和一次字典查找。
+    """
+    try:
+        abs_path, size, mtime_ns = _stat_key(path)
+    except OSError:
+        return None
+    key = f"{abs_path}|{size}|{mtime_ns}"
+
+    with _lock:
+        cache = _load_cache()
+        entry = cache.get(key)
+    if entry and not refresh:
+        return MediaInfo(**entry)
+
+    try:
+        info = parse_probe(path, size, run_ffprobe(path))
+    except (OSError, ValueError, subprocess.CalledProcessError) as e:
+        print(f"⚠️ ffprobe 失败: {path}: {e}")
+        return None
+
+    with _lock:
+        # 同一路径的旧条目（文件已被修改）一并清理
+        stale = _paths.get(abs_path)
+        if stale and stale != key:
+            cache.pop(stale, None)
+            _dirty.pop(stale, None)
+        _paths[abs_path] = key
+        cache[key] = _dirty[key] = asdict(info)
+    return info
+
+def flush():
+    """把本进程新增的探测结果写回磁盘缓存（进程退出时自动调用）"""
+    with _lock:
+        if not _dirty:
+            return
+        try:
+            _save_cache(_dirty)
+        except OSError as e:
+            print(f"⚠️ 无法写入探测缓存 {CACHE_PATH}: {e}")
+            return
+        _dirty.clear()
+
+atexit.register(flush)
+
+def get_duration(path):
+    """容器时长（秒），失败返回 None"""
+    info = probe(path)
+    return info.duration if info else None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="探测媒体文件信息（结果缓存在磁盘上）")
+    parser.add_argument("paths", nargs="+", help="媒体文件路径")
+    parser.add_argument("--refresh", action="store_true", help="忽略缓存重新探测")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出")
+    args = parser.parse_args()
+
+    results = []
+    for path in args.paths:
+        info = probe(path, refresh=args.refresh)
+        if not info:
+            print(f"❌ 无法探测: {path}", file=sys.stderr)
+            continue
+        results.append(info)
+
+    if args.json:
+        print(json.dumps([asdict(info) for info in results], ensure_ascii=False, indent=2))
+    else:
+        for info in results:
+            print(f"🎞️ {os.path.basename(info.path)}")
+            for field in fields(MediaInfo):
+                if field.name != "path":
+                    print(f"   {field.name:<18} {getattr(info, field.name)}")
@@ -0,0 +1,185 @@
+"""
+解码音频缓存 (16 kHz 单声道 PCM)
+每个源文件只用 ffmpeg 解码一次，结果保存为原始 s16le 文件，按源文件指纹命名；
+之后语音识别、响度测量等工具都通过内存映射 (np.memmap) 读取，只有用到的片段才会被读入内存。
+缓存默认放在源文件所在目录的 .pcm_cache/ 下，可用环境变量 PCM_CACHE_DIR 指定统一位置。
+每个缓存目录有容量上限（默认 4GB，约 45 集，环境变量 PCM_CACHE_MAX_GB 可改），
+解码新文件后按最近使用时间 (LRU) 淘汰最旧的缓存；也可用 --clear 直接清空。
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import subprocess
+
+import numpy as np
+
+# Add script directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from render_cache import file_fingerprint
+
+SAMPLE_RATE = 16000
+DTYPE = np.int16
+CACHE_DIR_NAME = ".pcm_cache"
+DEFAULT_MAX_BYTES = 4 * 1024 ** 3  # 4 GB，每集约 86MB
+
+def max_cache_bytes():
+    value = os.environ.get("PCM_CACHE_MAX_GB")
+    return int(float(value) * 1024 ** 3) if value else DEFAULT_MAX_BYTES
+
+def cache_dir_for(source_path, cache_dir=None):
+    return cache_dir or os.environ.get("PCM_CACHE_DIR") or os.path.join(
+        os.path.dirname(os.path.abspath(source_path)), CACHE_DIR_NAME
+    )
+
+def pcm_path(source_path, cache_dir=None):
+    """缓存文件路径: <缓存目录>/<源文件名>_<指纹前16位>.s16le"""
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    key = file_fingerprint(source_path)[:16]
+    return os.path.join(cache_dir_for(source_path, cache_dir), f"{stem}_{key}.s16le")
+
+def decode_pcm(source_path, cache_dir=None):
+    """确保源文件已解码进缓存，返回 PCM 文件路径（已存在时直接返回）"""
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(source_path)
+    path = pcm_path(source_path, cache_dir)
+    meta_path = path + ".json"
+    if os.path.exists(path) and os.path.exists(meta_path):
+        os.utime(path)  # 刷新最近使用时间，供 LRU 淘汰参考
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    part_path = path + ".part"
+    cmd = [
+        "ffmpeg", "-nostdin", "-v", "error", "-y",
+        "-i", source_path,
+        "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE),
+        "-f", "s16le", "-acodec", "pcm_s16le",
+        part_path
+    ]
+    print(f"🎧 解码音频到 PCM 缓存: {os.path.basename(source_path)}")
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
+    except subprocess.CalledProcessError as e:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise RuntimeError(f"ffmpeg 解码失败: {e.stderr.strip()}") from e
+
+    samples = os.path.getsize(part_path) // np.dtype(DTYPE).itemsize
+    os.replace(part_path, path)
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({
+            "source": os.path.abspath(source_path),
+            "sample_rate": SAMPLE_RATE,
+            "channels": 1,
+            "dtype": "s16le",
+            "samples": samples,
+        }, f, ensure_ascii=False, indent=2)
+    os.replace(meta_path + ".tmp", meta_path)
+    evict(os.path.dirname(path), max_cache_bytes(), keep=path)
+    return path
+
+def evict(cache_dir, max_bytes, keep=None):
+    """缓存目录超过容量上限时，按修改时间从旧到新删除 PCM 文件（连同 .json 元数据），返回删除的个数"""
+    if not os.path.isdir(cache_dir):
+        return 0
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".s16le"):
+            path = os.path.join(cache_dir, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if keep and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        for stale in (path, path + ".json"):
+            if os.path.exists(stale):
+                os.remove(stale)
+        total -= size
+        removed += 1
+    if removed:
+        print(f"🧹 PCM 缓存超过 {max_bytes / 1024 ** 3:.1f}GB，已淘汰 {removed} 个最久未用的文件: {cache_dir}")
+    return removed
+
+def load_pcm(source_path, cache_dir=None):
+    """返回只读的 int16 内存映射数组（按需解码）"""
+    path = decode_pcm(source_path, cache_dir)
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=DTYPE)
+    return np.memmap(path, dtype=DTYPE, mode="r")
+
+def duration(pcm):
+    return len(pcm) / SAMPLE_RATE
+
+def pcm_slice(pcm, start=0.0, end=None):
+    """按秒截取，返回视图（不复制数据）"""
+    start_sample = max(0, int(start * SAMPLE_RATE))
+    end_sample = len(pcm) if end is None else min(len(pcm), int(end * SAMPLE_RATE))
+    return pcm[start_sample:end_sample]
+
+def to_float32(samples):
+    """int16 -> [-1, 1) float32（Whisper 等模型的输入格式），只复制传入的这一段"""
+    return np.asarray(samples, dtype=np.float32) / 32768.0
+
+def read_float32(source_path, start=0.0, end=None, cache_dir=None):
+    return to_float32(pcm_slice(load_pcm(source_path, cache_dir), start, end))
+
+def rms_dbfs(samples):
+    """片段的 RMS 电平 (dBFS)，静音返回 -inf"""
+    if len(samples) == 0:
+        return float("-inf")
+    rms = np.sqrt(np.mean(np.square(samples, dtype=np.float64))) / 32768.0
+    return 20 * np.log10(rms) if rms > 0 else float("-inf")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="预先把音频解码进 16 kHz 单声道 PCM 缓存")
+    parser.add_argument("paths", nargs="+", help="视频/音频文件或目录")
+    parser.add_argument("--cache-dir", help=f"缓存目录（默认: 源文件目录下的 {CACHE_DIR_NAME}/）")
+    parser.add_argument("--clear", action="store_true",
+                        help=f"不解码，删除这些路径下的 {CACHE_DIR_NAME}/ 缓存目录（或 --cache-dir / PCM_CACHE_DIR 指定的目录）")
+    args = parser.parse_args()
+
+    if args.clear:
+        shared_dir = args.cache_dir or os.environ.get("PCM_CACHE_DIR")
+        cache_dirs = [shared_dir] if shared_dir else []
+        for path in args.paths if not shared_dir else []:
+            if os.path.isdir(path):
+                for root, dirs, _ in os.walk(path):
+                    if CACHE_DIR_NAME in dirs:
+                        cache_dirs.append(os.path.join(root, CACHE_DIR_NAME))
+                        dirs.remove(CACHE_DIR_NAME)
+            else:
+                cache_dirs.append(cache_dir_for(path))
+        freed = 0
+        for cache_dir in sorted(set(cache_dirs)):
+            if not os.path.isdir(cache_dir):
+                continue
+            freed += sum(entry.stat().st_size for entry in os.scandir(cache_dir) if entry.is_file())
+            shutil.rmtree(cache_dir)
+            print(f"🗑️ 已删除 {cache_dir}")
+        print(f"✅ 共释放 {freed / 1024 ** 2:.1f}MB")
+        sys.exit(0)
+
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs[:] = [d for d in dirs if d != CACHE_DIR_NAME]
+                files.extend(
+                    os.path.join(root, name) for name in names
+                    if name.lower().endswith(('.mp4', '.mkv', '.avi', '.mov', '.flv', '.mp3', '.wav', '.m4a'))
+                )
+        else:
+            files.append(path)
+
+    for path in sorted(files):
+        pcm = load_pcm(path, args.cache_dir)
+        print(f"✅ {os.path.basename(path)}: {duration(pcm) / 60:.1f} 分钟, "
+              f"{pcm.nbytes / 1024 ** 2:.1f}MB, 平均电平 {rms_dbfs(pcm_slice(pcm, 0, 600)):.1f} dBFS (前 10 分钟)")
@@ -1,25 +1,181 @@
 import sys
 import os
+import argparse
 import subprocess
 import json
 import time
 import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Add script directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from typewriter import write_typewriter_ass, subtitles_filter, font_family, escape_filter_value
+from render_cache import RenderCache, cache_key, file_fingerprint
+from strategy_common import FONT_PATH, MAX_CHARS_PER_LINE, time_to_seconds, format_clock, wrap_commentary
+import media_probe
+import validate_strategy
 
 # 配置
-FONT_PATH = "/System/Library/Fonts/STHeiti Medium.ttc"
 FADE_DURATION = 0.5  # 转场淡入淡出时长（秒）
+CLIP_RENDER_MODES = ["single", "two-pass"]  # single: 一次编码直出; two-pass: 先切 raw 再合成（兜底）
+RENDER_MODES = CLIP_RENDER_MODES + ["episode"]  # episode: 整集一个 ffmpeg 进程，片段间 xfade 转场
+EPISODE_TRANSITION = "fadeblack"  # 整集模式片段之间的 xfade 转场效果
+PROGRESS_INTERVAL = 3.0  # ffmpeg 进度输出间隔（秒）
+BG_MODES = ["lowres", "full"]  # lowres: 低分辨率模糊后放大; full: 全分辨率模糊（旧）
+BG_LOWRES_FACTOR = 4  # lowres 模式下在 270x480 上模糊
+# 渲染档位: 同一次解码 + 滤镜可以同时编码多个输出
+# suffix: 成片文件名后缀; vf: 该档位额外的画面滤镜; args: 编码参数
+# max_size_mb: 成片体积上限。按成片总时长算出码率预算，用 -maxrate/-bufsize (VBV) 限制视频码率，
+#              再扣掉音频码率 audio_kbps，保证整个文件不超过上限；max_video_kbps 为预算充足时的码率上限
+RENDER_PROFILES = {
+    # 与之前的默认输出一致
+    "default": {"suffix": "", "vf": None, "args": ["-c:v", "libx264", "-c:a", "aac"]},
+    # 高码率母版，用于存档和二次剪辑
+    "master": {
+        "suffix": "-master", "vf": None,
+        "args": ["-c:v", "libx264", "-preset", "slow", "-crf", "18", "-c:a", "aac", "-b:a", "192k"],
+    },
+    # 微信视频号: 限制峰值码率，控制上传体积
+    "wechat": {
+        "suffix": "-wechat", "vf": None,
+        "args": ["-c:v", "libx264", "-crf", "23", "-c:a", "aac", "-b:a", "128k"],
+        "max_size_mb": 200, "audio_kbps": 128, "max_video_kbps": 4000,
+    },
+    # 抖音
+    "douyin": {
+        "suffix": "-douyin", "vf": None,
+        "args": ["-c:v", "libx264", "-crf", "21", "-maxrate", "8M", "-bufsize", "16M",
+                 "-c:a", "aac", "-b:a", "160k"],
+    },
+    # YouTube Shorts (9:16)
+    "youtube": {
+        "suffix": "-youtube", "vf": None,
+        "args": ["-c:v", "libx264", "-crf", "20", "-c:a", "aac", "-b:a", "192k"],
+    },
+    # 16:9 横屏版本: 竖屏画面居中，两侧补黑边
+    "landscape": {
+        "suffix": "-landscape", "vf": "scale=-2:1080,pad=1920:1080:(ow-iw)/2:0,setsar=1",
+        "args": ["-c:v", "libx264", "-crf", "20", "-c:a", "aac", "-b:a", "192k"],
+    },
+}
+SIZE_CAP_HEADROOM = 0.95  # 给 MP4 容器开销和 VBV 缓冲留的余量
+MIN_CAPPED_VIDEO_KBPS = 300  # 预算低于它时画质会明显变差，给出警告
+RENDER_CACHE_VERSION = 3  # 修改渲染滤镜图/编码参数后递增，使旧缓存失效
+AVATAR_SIZE = 120
+# 头像缩放 + 圆形透明遮罩（只在预处理时对单帧执行一次）
+AVATAR_ROUND_FILTER = (
+    f"scale={AVATAR_SIZE}:{AVATAR_SIZE},format=rgba,"
+    "geq=lum='p(X,Y)':a='if(gt(sqrt(pow(X-60,2)+pow(Y-60,2)),60),0,255)'"
+)
+
+class TimingLog:
+    """
+    渲染耗时记录（线程安全）。每个成功的 ffmpeg 任务一条：阶段、片段、媒体时长、墙钟耗时、实时倍率。
+    main 结束时追加写入成片旁边的 {视频名}-timings.json，便于长期跟踪渲染吞吐。
+    """
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def add(self, stage, clip_id, media_duration, wall_time):
+        realtime_factor = media_duration / wall_time if media_duration and wall_time > 0 else None
+        with self._lock:
+            self.records.append({
+                "stage": stage,
+                "clip_id": clip_id,
+                "media_duration": round(media_duration, 3) if media_duration else None,
+                "wall_time": round(wall_time, 3),
+                "realtime_factor": round(realtime_factor, 3) if realtime_factor else None,
+            })
+
+    def save(self, path, run_info=None):
+        runs = []
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    runs = json.load(f)
+            except (OSError, ValueError):
+                print(f"⚠️ 耗时记录文件损坏，将重新创建: {path}")
+        with self._lock:
+            runs.append({
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                **(run_info or {}),
+                "records": self.records,
+            })
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(runs, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        print(f"📊 耗时记录已写入: {path}")
+
+TIMINGS = TimingLog()
 
-def run_cmd(cmd):
+def print_progress(label, state, media_duration, elapsed):
+    """根据 ffmpeg -progress 输出的键值打印一行进度"""
+    out_time_us = state.get("out_time_us", state.get("out_time_ms", "N/A"))
+    try:
+        out_time = max(0, int(out_time_us) / 1_000_000)
+    except ValueError:
+        out_time = 0
+    msg = f"   ⏳ [{label}] {format_clock(out_time)}"
+    if media_duration:
+        msg += f"/{format_clock(media_duration)} ({min(100, out_time / media_duration * 100):.0f}%)"
+    msg += f" fps={state.get('fps', 'N/A')} speed={state.get('speed', 'N/A').strip()}"
+    if media_duration and out_time > 0 and state.get("progress") != "end":
+        eta = max(0, media_duration - out_time) * elapsed / out_time
+        msg += f" ETA {eta:.0f}s"
+    print(msg, flush=True)
+
+def run_with_progress(cmd, label, media_duration):
+    """运行命令并解析 stdout 上的 ffmpeg 进度，stderr 在后台线程中读取（只保留末尾）"""
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True, encoding="utf-8", errors="replace"
+    )
+    stderr_tail = deque(maxlen=200)
+    stderr_thread = threading.Thread(target=stderr_tail.extend, args=(proc.stderr,), daemon=True)
+    stderr_thread.start()
+
+    t0 = time.time()
+    last_print = 0
+    state = {}
+    for line in proc.stdout:
+        key, _, value = line.strip().partition("=")
+        state[key] = value
+        if key == "progress":
+            now = time.time()
+            if value == "end" or now - last_print >= PROGRESS_INTERVAL:
+                print_progress(label, state, media_duration, now - t0)
+                last_print = now
+    proc.wait()
+    stderr_thread.join()
+    return proc.returncode, "".join(stderr_tail)
+
+def run_cmd(cmd, stage=None, clip_id=None, media_duration=None):
+    """
+    执行命令，失败时重试。
+    ffmpeg 命令会附加 -progress pipe:1，实时显示 fps / 速度 / 预计剩余时间；
+    成功后把本次任务的耗时记录到 TIMINGS。
+    """
+    if os.path.basename(cmd[0]) == "ffmpeg":
+        cmd = [cmd[0], "-progress", "pipe:1", "-nostats"] + cmd[1:]
+    label = clip_id or stage or "ffmpeg"
     max_retries = 3
     for i in range(max_retries):
         try:
-            result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
-            if result.returncode == 0:
+            t0 = time.time()
+            returncode, stderr = run_with_progress(cmd, label, media_duration)
+            if returncode == 0:
+                TIMINGS.add(stage, clip_id, media_duration, time.time() - t0)
                 return True
             else:
                 print(f"⚠️ Warning (Attempt {i+1}): Command failed.")
                 print(f"Command: {' '.join(cmd)}")
-                print(f"Error output:\n{result.stderr[-1000:]}") # Print last 1000 chars
+                print(f"Error output:\n{stderr[-1000:]}") # Print last 1000 chars
                 time.sleep(1) 
         except Exception as e:
             print(f"❌ Exception: {e}")
@@ -27,61 +183,74 @@ def run_cmd(cmd):
     print(f"❌ Failed after {max_retries} attempts.")
     return False
 
-def process_clip(clip_data, video_path, temp_dir, font_path, avatar_path=None):
-    clip_id = clip_data["id"]
+def escape_text(t):
+    # 先按 drawtext 的文本展开转义（"\x" 表示字面 x，单独的 % 会报 "Stray %"），
+    # 再按选项层、滤镜图层两级转义，' : , ; [ ] 都能原样显示；结果不要再加引号
+    return escape_filter_value(t.replace("\\", "\\\\").replace("%", "\\%"))
+
+def prepare_avatar(avatar_path, asset_dir):
+    """
+    把头像预处理成 120x120 带透明圆形遮罩的 PNG，按源图内容哈希缓存。
+    同一个系列只需生成一次，渲染时直接叠加，不再逐帧计算 geq 遮罩。
+    失败时返回 None。
+    """
+    os.makedirs(asset_dir, exist_ok=True)
+    avatar_hash = file_fingerprint(avatar_path, full=True)
+    round_path = os.path.join(asset_dir, f"avatar_round_{avatar_hash[:16]}.png")
+    if os.path.exists(round_path):
+        return round_path
+
+    part_path = os.path.join(asset_dir, f"avatar_round_{avatar_hash[:16]}.part.png")
+    cmd = [
+        "ffmpeg", "-i", avatar_path, "-vf", AVATAR_ROUND_FILTER,
+        "-frames:v", "1", "-y", part_path
+    ]
+    if not run_cmd(cmd, stage="avatar"):
+        return None
+    os.replace(part_path, round_path)
+    print(f"🟡 已生成圆形头像: {round_path}")
+    return round_path
+
+def background_filter(bg_mode="lowres", prefix=""):
+    """
+    模糊背景分支: [{prefix}bg] -> [{prefix}bg_blurred]
+    full:   在 1080x1920 上直接 boxblur=20:10
+    lowres: 先缩到 1/4 分辨率，用等比缩小的半径模糊，再放大回 1080x1920。
+            背景本来就是糊的，放大带来的插值平滑在视觉上与全分辨率模糊一致，滤镜开销约为原来的 1/16
+    """
+    if bg_mode == "full":
+        return (
+            f"[{prefix}bg]scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920,"
+            f"boxblur=20:10[{prefix}bg_blurred]"
+        )
+    w, h = 1080 // BG_LOWRES_FACTOR, 1920 // BG_LOWRES_FACTOR
+    radius = 20 // BG_LOWRES_FACTOR
+    return (
+        f"[{prefix}bg]scale={w}:{h}:force_original_aspect_ratio=increase,crop={w}:{h},"
+        f"boxblur={radius}:10,scale=1080:1920[{prefix}bg_blurred]"
+    )
+
+def build_layout_graph(clip_data, font_path, ass_path, avatar_path=None, bg_mode="lowres",
+                       video_in="0:v", avatar_in="1:v", out_label="pre_fade", prefix=""):
+    """
+    构建单个片段的竖屏 + 双字幕布局滤镜链（不含淡入淡出），并把解说打字机字幕写入 ass_path。
+    video_in 为已经从 0 秒开始的片段画面，avatar_in 为 prepare_avatar 生成的圆形头像（可选）。
+    prefix 用于给中间标签加前缀，方便把多个片段放进同一个滤镜图。
+    返回 (滤镜链, 片段时长)，输出标签为 [out_label]。
+    """
     start = clip_data["time_range"]["start"]
     end = clip_data["time_range"]["end"]
     title = clip_data["title"]
     commentary = clip_data["commentary_text"]
-    
-    raw_clip_path = os.path.join(temp_dir, f"{clip_id}_raw.mp4")
-    final_clip_path = os.path.join(temp_dir, f"{clip_id}_vertical.mp4")
-    
-    # 检查如果目标文件已存在且大小正常，则跳过（断点续传）
-    if os.path.exists(final_clip_path) and os.path.getsize(final_clip_path) > 1000:
-        print(f"⏩ 跳过已存在的片段: {title}")
-        return final_clip_path
-
-    print(f"🎬 处理片段: {title} ({start}-{end})...")
-
-    # 1. 提取片段 (精确剪辑)
-    extract_cmd = [
-        "ffmpeg", "-ss", start, "-to", end, "-i", video_path,
-        "-c:v", "libx264", "-c:a", "aac", "-y", raw_clip_path
-    ]
-    if not run_cmd(extract_cmd): return None
 
-    # 2. 转竖屏 + 双字幕布局
-    def escape_text(t):
-        t = t.replace("\\", "\\\\").replace(":", "\\:").replace("'", "'\\''")
-        return t
-    
     title_safe = escape_text(title)
-    
-    MAX_CHARS_PER_LINE = 16 # 缩减一点，给头像留位置
-    
-    processed_lines = []
-    original_lines = commentary.split('\n')
-    for line in original_lines:
-        current_line = ""
-        count = 0
-        for char in line:
-            char_len = 1 if ord(char) > 127 else 0.5
-            if count + char_len > MAX_CHARS_PER_LINE:
-                processed_lines.append(current_line)
-                current_line = char
-                count = char_len
-            else:
-                current_line += char
-                count += char_len
-        if current_line:
-            processed_lines.append(current_line)
-            
+    processed_lines = wrap_commentary(commentary)
+
     draw_cmds = []
     
     # 标题命令
     draw_cmds.append(
-        f"drawtext=fontfile='{font_path}':text='{title_safe}':"
+        f"drawtext=fontfile='{font_path}':text={title_safe}:"
         "fontcolor=yellow:fontsize=80:"
         "x=(w-text_w)/2:y=350:"
         "borderw=4:bordercolor=black:"
@@ -97,10 +266,6 @@ def process_clip(clip_data, video_path, temp_dir, font_path, avatar_path=None):
     total_chars = sum(len(line) for line in processed_lines)
     
     # 获取片段总时长
-    def time_to_seconds(t_str):
-        h, m, s = map(float, t_str.split(':'))
-        return h * 3600 + m * 60 + s
-        
     clip_duration = time_to_seconds(end) - time_to_seconds(start)
     
     # 动态计算打字速度：在 90% 的时长内均匀吐完所有字
@@ -110,43 +275,15 @@ def process_clip(clip_data, video_path, temp_dir, font_path, avatar_path=None):
     
     print(f"⏱️ 动态打字速度: {typing_speed:.3f}s/字 (总字数: {total_chars}, 时长: {clip_duration:.1f}s)")
     
-    current_line_start_time = start_delay
-    
-    for i, line in enumerate(processed_lines):
-        current_y = base_y + (i * line_height)
-        # 如果有头像，文字左对齐，否则居中
-        x_pos = 260 if avatar_path else "(w-text_w)/2"
-        
-        # 1. 生成打字过程中的每一帧状态 (除了最后一个字)
-        for j in range(1, len(line)):
-            partial_text = escape_text(line[:j])
-            t_start = current_line_start_time + (j - 1) * typing_speed
-            t_end = current_line_start_time + j * typing_speed
-            
-            cmd = (
-                f"drawtext=fontfile='{font_path}':text='{partial_text}':"
-                "fontcolor=yellow:fontsize=50:"
-                f"x={x_pos}:y={current_y}:"
-                f"enable='between(t,{t_start:.2f},{t_end:.2f})':"
-                "borderw=2:bordercolor=black"
-            )
-            draw_cmds.append(cmd)
-            
-        # 2. 生成该行打字完成后的最终状态（持续显示到片段结束）
-        full_line_text = escape_text(line)
-        t_final_start = current_line_start_time + (len(line) - 1) * typing_speed
-        
-        cmd = (
-            f"drawtext=fontfile='{font_path}':text='{full_line_text}':"
-            "fontcolor=yellow:fontsize=50:"
-            f"x={x_pos}:y={current_y}:"
-            f"enable='gt(t,{t_final_start:.2f})':"
-            "borderw=2:bordercolor=black"
-        )
-        draw_cmds.append(cmd)
-        
-        # 累计下一行的开始时间
-        current_line_start_time += len(line) * typing_speed
+    # 解说打字机效果: 生成一条逐字显现的 ASS 字幕轨，用单个 subtitles 滤镜烧录
+    # 如果有头像，文字左对齐，否则居中
+    write_typewriter_ass(
+        ass_path, processed_lines, typing_speed, start_delay, clip_duration,
+        x_pos=260 if avatar_path else None,
+        base_y=base_y, line_height=line_height,
+        font_family_name=font_family(font_path)
+    )
+    draw_cmds.append(subtitles_filter(ass_path, os.path.dirname(font_path)))
     
     draw_text_filter = ",".join(draw_cmds)
     
@@ -157,16 +294,31 @@ def process_clip(clip_data, video_path, temp_dir, font_path, avatar_path=None):
     if avatar_path and os.path.exists(avatar_path):
         # 1. 基础背景
         # 2. 绘制半透明气泡框
-        # 3. 处理头像 (缩放 + 圆形裁剪)
-        # 4. 叠加头像
+        # 3. 叠加预处理好的圆形头像 (见 prepare_avatar)
         avatar_filter = (
-            f"drawbox=y=1380:x=80:w=920:h={bubble_h}:color=black@0.5:t=fill[with_bubble];"
-            f"[1:v]scale=120:120,format=rgba,geq=lum='p(X,Y)':a='if(gt(sqrt(pow(X-60,2)+pow(Y-60,2)),60),0,255)'[avatar_round];"
-            f"[with_bubble][avatar_round]overlay=110:1410[with_avatar];"
-            f"[with_avatar]{draw_text_filter}[pre_fade]"
+            f"drawbox=y=1380:x=80:w=920:h={bubble_h}:color=black@0.5:t=fill[{prefix}with_bubble];"
+            f"[{prefix}with_bubble][{avatar_in}]overlay=110:1410[{prefix}with_avatar];"
+            f"[{prefix}with_avatar]{draw_text_filter}[{out_label}]"
         )
     else:
-        avatar_filter = f"{draw_text_filter}[pre_fade]"
+        avatar_filter = f"{draw_text_filter}[{out_label}]"
+
+    layout = (
+        f"[{video_in}]split=2[{prefix}bg][{prefix}main];"
+        f"{background_filter(bg_mode, prefix)};"
+        f"[{prefix}main]scale=1080:-1[{prefix}main_scaled];"
+        f"[{prefix}bg_blurred][{prefix}main_scaled]overlay=0:(H-h)/2[{prefix}merged];"
+        f"[{prefix}merged]{avatar_filter}"
+    )
+    return layout, clip_duration
+
+def build_filter_complex(clip_data, font_path, ass_path, avatar_path=None, bg_mode="lowres"):
+    """
+    构建单个片段的完整 filter_complex（布局 + 淡入淡出）。
+    输入约定: [0:v]/[0:a] 为已经从 0 秒开始的片段，[1:v] 为 prepare_avatar 生成的圆形头像（可选）。
+    输出标签: [outv] / [outa]
+    """
+    layout, clip_duration = build_layout_graph(clip_data, font_path, ass_path, avatar_path, bg_mode)
 
     # 添加淡入淡出转场效果
     fade_out_start = max(0, clip_duration - FADE_DURATION)
@@ -174,33 +326,353 @@ def process_clip(clip_data, video_path, temp_dir, font_path, avatar_path=None):
     audio_fade = f"[0:a]afade=t=in:st=0:d={FADE_DURATION},afade=t=out:st={fade_out_start:.2f}:d={FADE_DURATION}[outa]"
 
     filter_complex = (
-        "[0:v]split=2[bg][main];"
-        "[bg]scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920,boxblur=20:10[bg_blurred];"
-        "[main]scale=1080:-1[main_scaled];"
-        f"[bg_blurred][main_scaled]overlay=0:(H-h)/2[merged];"
-        f"[merged]{avatar_filter};"
+        f"{layout};"
         f"{fade_filter};"
         f"{audio_fade}"
     )
+    return filter_complex, clip_duration
+
+def thread_args(threads):
+    """单个 ffmpeg 任务的线程预算（滤镜 + 编码）"""
+    if not threads:
+        return []
+    return ["-filter_complex_threads", str(threads), "-threads", str(threads)]
+
+def encoder_threads(threads, outputs):
+    """
+    一个任务同时编码多个档位时，每个编码器分到的线程数：-threads 是按输出生效的，
+    平分后所有编码器的线程总数仍在任务的预算内（jobs × threads 不超过核心数）。
+    没有预算 (threads=None) 时单档位交给 ffmpeg 自行决定，多档位按全部核心平分
+    """
+    if not threads:
+        if outputs == 1:
+            return None
+        threads = os.cpu_count() or 1
+    return max(1, threads // outputs)
+
+def profile_outputs(profiles, video_label="outv", audio_label="outa"):
+    """
+    把滤镜图的一路画面/音频分成多路，每个渲染档位一路（解码和滤镜只做一次）。
+    返回 (附加的滤镜链, [(档位名, 视频标签, 音频标签)])
+    """
+    if len(profiles) == 1 and not RENDER_PROFILES[profiles[0]]["vf"]:
+        return "", [(profiles[0], video_label, audio_label)]
 
-    convert_cmd = [
-        "ffmpeg", "-i", raw_clip_path
+    n = len(profiles)
+    parts = [
+        f"[{video_label}]split={n}" + "".join(f"[pv{i}]" for i in range(n)),
+        f"[{audio_label}]asplit={n}" + "".join(f"[pa{i}]" for i in range(n)),
     ]
+    outputs = []
+    for i, profile in enumerate(profiles):
+        v_label = f"pv{i}"
+        vf = RENDER_PROFILES[profile]["vf"]
+        if vf:
+            parts.append(f"[pv{i}]{vf}[pvf{i}]")
+            v_label = f"pvf{i}"
+        outputs.append((profile, v_label, f"pa{i}"))
+    return ";".join(parts), outputs
+
+def capped_video_kbps(profile, total_duration):
+    """
+    有体积上限的档位: 按成片总时长分配的视频码率 (kbps)，其它档位返回 None。
+    逐片段模式下每个片段都用整集的预算码率编码，concat 后的总时长与各片段之和一致，总体积同样不超限。
+    """
+    settings = RENDER_PROFILES[profile]
+    max_size_mb = settings.get("max_size_mb")
+    if not max_size_mb or not total_duration:
+        return None
+    total_kbps = max_size_mb * 1024 ** 2 * 8 / 1000 * SIZE_CAP_HEADROOM / total_duration
+    video_kbps = int(total_kbps - settings.get("audio_kbps", 0))
+    return max(1, min(settings.get("max_video_kbps", video_kbps), video_kbps))
+
+def output_args(profile, video_label, audio_label, path, threads=None, total_duration=None):
+    """
+    单个档位输出的 -map + 编码参数。threads 为这一路编码器的线程数（见 encoder_threads）；
+    total_duration 为成片总时长，用于计算体积上限档位的码率预算
+    """
+    rate_args = []
+    video_kbps = capped_video_kbps(profile, total_duration)
+    if video_kbps:
+        # VBV 缓冲只有 1 秒的预算，整个文件的码率都被限制在预算内；CRF 决定预算以内的画质
+        rate_args = ["-maxrate", f"{video_kbps}k", "-bufsize", f"{video_kbps}k"]
+    return (
+        ["-map", f"[{video_label}]", "-map", f"[{audio_label}]"]
+        + RENDER_PROFILES[profile]["args"]
+        + rate_args
+        + (["-threads", str(threads)] if threads else [])
+        + ["-y", path]
+    )
+
+def report_size_budget(profiles, total_duration):
+    for profile in profiles:
+        video_kbps = capped_video_kbps(profile, total_duration)
+        if not video_kbps:
+            continue
+        print(f"📏 {profile}: 上限 {RENDER_PROFILES[profile]['max_size_mb']}MB, 成片 {total_duration:.1f}s, "
+              f"视频码率预算 {video_kbps}kbps")
+        if video_kbps < MIN_CAPPED_VIDEO_KBPS:
+            print(f"⚠️ {profile} 成片过长，码率预算只有 {video_kbps}kbps，画质会明显下降")
+
+def render_settings(mode, bg_mode="lowres", profile="default"):
+    """影响输出画面的渲染参数，参与缓存键计算"""
+    return {
+        "version": RENDER_CACHE_VERSION,
+        "mode": mode,
+        "bg_mode": bg_mode,
+        "fade_duration": FADE_DURATION,
+        "max_chars_per_line": MAX_CHARS_PER_LINE,
+        "profile": RENDER_PROFILES[profile],
+    }
+
+def clip_cache_key(clip_data, video_path, font_path, avatar_path=None, mode="single", bg_mode="lowres",
+                   profile="default", total_duration=None):
+    return cache_key({
+        "source": file_fingerprint(video_path),
+        "time_range": clip_data["time_range"],
+        "title": clip_data["title"],
+        "commentary": clip_data["commentary_text"],
+        "avatar": file_fingerprint(avatar_path, full=True) if avatar_path else None,
+        "font": file_fingerprint(font_path),
+        "settings": render_settings(mode, bg_mode, profile),
+        # 体积上限档位的码率取决于整集时长，增删片段后需要重新编码
+        "video_kbps": capped_video_kbps(profile, total_duration),
+    })
+
+def process_clip(clip_data, video_path, temp_dir, font_path, avatar_path=None, mode="single", threads=None,
+                 cache=None, bg_mode="lowres", profiles=None, total_duration=None):
+    """
+    渲染单个片段为竖屏 MP4。
+    mode="single":   直接从原片 seek 并一次性完成裁切、模糊、叠字、淡入淡出（只编码一次）
+    mode="two-pass": 旧流程，先重编码出 {clip_id}_raw.mp4，再做竖屏合成（兜底用）
+    threads: 该 ffmpeg 任务可用的线程数（并行渲染时由调度器分配），None 表示由 ffmpeg 自行决定
+    cache: RenderCache 实例；提供时按内容哈希复用已渲染的片段，否则沿用"文件已存在即跳过"
+    bg_mode: 模糊背景的处理方式，见 background_filter
+    profiles: 要输出的渲染档位列表（见 RENDER_PROFILES），同一个 ffmpeg 进程一次解码多路编码
+    total_duration: 合并后成片的总时长，有体积上限的档位按它分配码率
+    返回 {档位: 片段路径}，失败时返回 None。
+    """
+    clip_id = clip_data["id"]
+    start = clip_data["time_range"]["start"]
+    end = clip_data["time_range"]["end"]
+    title = clip_data["title"]
+    profiles = profiles or ["default"]
+    
+    raw_clip_path = os.path.join(temp_dir, f"{clip_id}_raw.mp4")
+    ass_path = os.path.join(temp_dir, f"{clip_id}_typewriter.ass")
+
+    results = {}
+    pending = {}  # 需要渲染的档位: {档位: (目标路径, 缓存键)}
+    for profile in profiles:
+        suffix = RENDER_PROFILES[profile]["suffix"]
+        if cache is not None:
+            # 按内容哈希查找缓存：标题、解说、时间范围、素材或渲染参数任一变化都会重新渲染
+            key = clip_cache_key(clip_data, video_path, font_path, avatar_path, mode, bg_mode, profile,
+                                 total_duration)
+            cached_path = cache.lookup(key)
+            if cached_path:
+                results[profile] = cached_path
+                continue
+            pending[profile] = (cache.path_for(key, f"{clip_id}{suffix}"), key)
+        else:
+            final_clip_path = os.path.join(temp_dir, f"{clip_id}_vertical{suffix}.mp4")
+            # 检查如果目标文件已存在且大小正常，则跳过（断点续传）
+            if os.path.exists(final_clip_path) and os.path.getsize(final_clip_path) > 1000:
+                results[profile] = final_clip_path
+                continue
+            pending[profile] = (final_clip_path, None)
+
+    if not pending:
+        if cache is not None:
+            print(f"⏩ 命中渲染缓存: {title}")
+        else:
+            print(f"⏩ 跳过已存在的片段: {title}")
+        return results
+
+    print(f"🎬 处理片段: {title} ({start}-{end}) [{mode}, {'/'.join(pending)}]...")
+    clip_duration = time_to_seconds(end) - time_to_seconds(start)
+
+    if mode == "two-pass":
+        # 1. 提取片段 (精确剪辑)
+        extract_cmd = [
+            "ffmpeg", "-ss", start, "-to", end, "-i", video_path,
+            "-c:v", "libx264", "-c:a", "aac"
+        ] + thread_args(threads) + ["-y", raw_clip_path]
+        if not run_cmd(extract_cmd, stage="extract", clip_id=clip_id, media_duration=clip_duration): return None
+        input_args = ["-i", raw_clip_path]
+    else:
+        # 输入端 seek：解码时精确定位，时间戳从 0 开始，与 raw 片段一致
+        input_args = ["-ss", start, "-to", end, "-i", video_path]
+
+    # 2. 转竖屏 + 双字幕布局，再按档位分路
+    filter_complex, _ = build_filter_complex(clip_data, font_path, ass_path, avatar_path, bg_mode)
+    split_filter, outputs = profile_outputs(list(pending))
+    if split_filter:
+        filter_complex += ";" + split_filter
+
+    convert_cmd = ["ffmpeg"] + input_args
     if avatar_path and os.path.exists(avatar_path):
         convert_cmd.extend(["-i", avatar_path])
         
-    convert_cmd.extend([
-        "-filter_complex", filter_complex,
-        "-map", "[outv]", "-map", "[outa]",
-        "-c:v", "libx264", "-c:a", "aac", "-y", final_clip_path
-    ])
+    convert_cmd.extend(["-filter_complex", filter_complex])
+    if threads:
+        convert_cmd.extend(["-filter_complex_threads", str(threads)])
+    # 先写入临时文件，成功后再改名，避免中断留下不完整的片段
+    for profile, v_label, a_label in outputs:
+        part_path = os.path.splitext(pending[profile][0])[0] + ".part.mp4"
+        convert_cmd.extend(output_args(profile, v_label, a_label, part_path,
+                                       encoder_threads(threads, len(outputs)), total_duration))
     
-    if run_cmd(convert_cmd):
-        return final_clip_path
-    return None
+    if not run_cmd(convert_cmd, stage="render", clip_id=clip_id, media_duration=clip_duration):
+        return None
 
-def merge_final(clips_paths, output_dir, final_filename, temp_dir):
-    list_path = os.path.join(temp_dir, "merge_list.txt")
+    for profile, (final_clip_path, key) in pending.items():
+        os.replace(os.path.splitext(final_clip_path)[0] + ".part.mp4", final_clip_path)
+        if cache is not None:
+            cache.store(key, final_clip_path, label=f"{clip_id} {title} [{profile}]")
+        results[profile] = final_clip_path
+    return results
+
+def render_clips(clips, video_path, temp_dir, font_path, avatar_path=None, mode="single", jobs=1, cache=None,
+                 bg_mode="lowres", profiles=None):
+    """
+    用线程池并发渲染片段（每个片段是一个独立的 ffmpeg 进程）。
+    每个任务分到 cpu_count // jobs 个线程，保证 jobs × threads 不超过核心数。
+    返回值为 [(片段, {档位: 路径})]，按 JSON 中的片段顺序排列，失败的片段会被跳过。
+    """
+    jobs = max(1, min(jobs, len(clips)))
+    cpu_count = os.cpu_count() or 1
+    threads = max(1, cpu_count // jobs) if jobs > 1 else None
+    if jobs > 1:
+        print(f"🧵 并行渲染: {jobs} 个任务 × {threads} 线程 (CPU 核心数: {cpu_count})")
+
+    # concat 后的成片时长 = 各片段时长之和
+    total_duration = sum(
+        time_to_seconds(clip["time_range"]["end"]) - time_to_seconds(clip["time_range"]["start"]) for clip in clips
+    )
+    report_size_budget(profiles or ["default"], total_duration)
+
+    def render_one(clip):
+        t0 = time.time()
+        res = process_clip(clip, video_path, temp_dir, font_path, avatar_path, mode=mode, threads=threads,
+                           cache=cache, bg_mode=bg_mode, profiles=profiles, total_duration=total_duration)
+        return res, time.time() - t0
+
+    total_start = time.time()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(render_one, clips))
+    total_time = time.time() - total_start
+
+    print("-" * 60)
+    print(f"{'片段':<12} | {'时长':<8} | {'耗时':<8} | {'状态':<6}")
+    print("-" * 60)
+    for clip, (res, elapsed) in zip(clips, results):
+        clip_duration = time_to_seconds(clip["time_range"]["end"]) - time_to_seconds(clip["time_range"]["start"])
+        status = "✅" if res else "❌"
+        print(f"{clip['id']:<12} | {clip_duration:>6.1f}s | {elapsed:>6.1f}s | {status}")
+    print("-" * 60)
+    clip_time_sum = sum(elapsed for _, elapsed in results)
+    print(f"⏱️ 渲染总耗时: {total_time:.1f}s (各片段耗时合计 {clip_time_sum:.1f}s, jobs={jobs})")
+
+    return [(clip, res) for clip, (res, _) in zip(clips, results) if res]
+
+def render_episode(clips, video_path, temp_dir, output_paths, font_path, avatar_path=None, bg_mode="lowres",
+                   threads=None):
+    """
+    整集模式: 用一次 ffmpeg 调用渲染策略里的所有片段。
+    每个片段是原片的一个 seek 输入，在同一个滤镜图里完成各自的布局，
+    片段之间用 xfade/acrossfade 转场，首尾淡入淡出，直接输出最终的 -Clip.mp4。
+    没有逐片段的进程启动、中间文件和单独的 concat，也不会因为各片段编码参数略有差异导致拼接瑕疵。
+    output_paths: {档位: 成片路径}，所有档位共用同一次解码和滤镜。
+    """
+    if not clips:
+        return False
+
+    # 转场时长与逐片段模式的"淡出 + 淡入"总时长一致
+    transition = FADE_DURATION * 2
+    has_avatar = bool(avatar_path and os.path.exists(avatar_path))
+
+    cmd = ["ffmpeg"]
+    for clip in clips:
+        cmd.extend(["-ss", clip["time_range"]["start"], "-to", clip["time_range"]["end"], "-i", video_path])
+    if has_avatar:
+        cmd.extend(["-i", avatar_path])
+
+    parts = []
+    if has_avatar:
+        avatar_labels = "".join(f"[av{i}]" for i in range(len(clips)))
+        parts.append(f"[{len(clips)}:v]split={len(clips)}{avatar_labels}")
+
+    durations = []
+    for i, clip in enumerate(clips):
+        print(f"🎬 片段 {i + 1}/{len(clips)}: {clip['title']} ({clip['time_range']['start']}-{clip['time_range']['end']})")
+        ass_path = os.path.join(temp_dir, f"{clip['id']}_typewriter.ass")
+        layout, clip_duration = build_layout_graph(
+            clip, font_path, ass_path, avatar_path if has_avatar else None, bg_mode,
+            video_in=f"{i}:v", avatar_in=f"av{i}", out_label=f"c{i}_pre", prefix=f"c{i}_"
+        )
+        if clip_duration <= transition:
+            print(f"❌ 片段 {clip['id']} 时长 {clip_duration:.1f}s 不足以做 {transition:.1f}s 的转场")
+            return False
+        parts.append(layout)
+        # xfade 要求两路输入像素格式一致
+        parts.append(f"[c{i}_pre]format=yuv420p[v{i}]")
+        durations.append(clip_duration)
+
+    # 依次用 xfade/acrossfade 串联，offset 为已拼接部分的长度减去转场时长
+    video_label, audio_label = "v0", "0:a"
+    total = durations[0]
+    for i in range(1, len(clips)):
+        offset = total - transition
+        parts.append(
+            f"[{video_label}][v{i}]xfade=transition={EPISODE_TRANSITION}:"
+            f"duration={transition}:offset={offset:.3f}[xv{i}]"
+        )
+        parts.append(f"[{audio_label}][{i}:a]acrossfade=d={transition}[xa{i}]")
+        video_label, audio_label = f"xv{i}", f"xa{i}"
+        total += durations[i] - transition
+
+    # 整体首尾淡入淡出
+    fade_out_start = max(0, total - FADE_DURATION)
+    parts.append(
+        f"[{video_label}]fade=t=in:st=0:d={FADE_DURATION},"
+        f"fade=t=out:st={fade_out_start:.2f}:d={FADE_DURATION},format=yuv420p[outv]"
+    )
+    parts.append(
+        f"[{audio_label}]afade=t=in:st=0:d={FADE_DURATION},"
+        f"afade=t=out:st={fade_out_start:.2f}:d={FADE_DURATION}[outa]"
+    )
+
+    split_filter, outputs = profile_outputs(list(output_paths))
+    if split_filter:
+        parts.append(split_filter)
+    cmd.extend(["-filter_complex", ";".join(parts)])
+    if threads:
+        cmd.extend(["-filter_complex_threads", str(threads)])
+    report_size_budget(list(output_paths), total)
+    for profile, v_label, a_label in outputs:
+        part_path = os.path.splitext(output_paths[profile])[0] + ".part.mp4"
+        cmd.extend(output_args(profile, v_label, a_label, part_path, encoder_threads(threads, len(outputs)), total))
+
+    print(f"🚀 整集渲染: {len(clips)} 个片段, 成片约 {total:.1f}s...")
+    if not run_cmd(cmd, stage="episode", media_duration=total):
+        return False
+    for output_path in output_paths.values():
+        os.replace(os.path.splitext(output_path)[0] + ".part.mp4", output_path)
+    return True
+
+def check_output_size(profile, output_path):
+    """检查成片体积是否超出档位的上限（码率预算已按上限分配，这里只是最后的保险）"""
+    max_size_mb = RENDER_PROFILES[profile].get("max_size_mb")
+    if not max_size_mb or not os.path.exists(output_path):
+        return
+    size_mb = os.path.getsize(output_path) / 1024 ** 2
+    if size_mb > max_size_mb:
+        print(f"⚠️ {profile} 成片 {size_mb:.1f}MB 超出上限 {max_size_mb}MB: {output_path}")
+
+def merge_final(clips_paths, output_dir, final_filename, temp_dir, total_duration=None):
+    """concat 合并片段（-c copy）；total_duration 为各片段时长之和，只用于显示合并进度"""
+    list_path = os.path.join(temp_dir, f"{os.path.splitext(final_filename)[0]}_merge_list.txt")
     with open(list_path, "w", encoding="utf-8") as f:
         for p in clips_paths:
             abs_path = os.path.abspath(p).replace("\\", "/")
@@ -214,18 +686,40 @@ def merge_final(clips_paths, output_dir, final_filename, temp_dir):
         "-c", "copy", "-y", output_path
     ]
     
-    if run_cmd(merge_cmd):
+    if run_cmd(merge_cmd, stage="merge", media_duration=total_duration):
         print(f"✅✅✅ 任务完成！文件位置: {output_path}")
     else:
         print("❌ 合并失败")
 
 def main():
-    if len(sys.argv) < 2:
-        print("用法: uv run scripts/produce_short_video.py <config_file_path>")
-        print("示例: uv run scripts/produce_short_video.py series/jinhun/config/《金婚》第01集-Strategy.json")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="根据策略 JSON 生成 9:16 竖屏短视频",
+        epilog="示例: uv run scripts/produce_short_video.py series/jinhun/config/《金婚》第01集-Strategy.json"
+    )
+    parser.add_argument("config_file_path", help="策略 JSON 文件路径")
+    parser.add_argument("--mode", choices=RENDER_MODES, default="single",
+                        help="渲染模式: single=原片直出一次编码 (默认), two-pass=先切 raw 片段再合成 (兜底), "
+                             "episode=整集一个 ffmpeg 进程、片段间 xfade 转场")
+    parser.add_argument("--bg-mode", choices=BG_MODES, default="lowres",
+                        help="模糊背景: lowres=低分辨率模糊后放大 (默认), full=全分辨率模糊 (旧)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="并行渲染的片段数 (默认: 1，每个任务的线程数 = CPU 核心数 / jobs)")
+    parser.add_argument("--cache-size", type=float, default=20,
+                        help="渲染缓存容量上限 (GB，默认: 20)，超出后按最近最少使用淘汰")
+    parser.add_argument("--profiles", default="default",
+                        help=f"渲染档位，逗号分隔，一次解码同时输出 (可选: {', '.join(RENDER_PROFILES)}; 默认: default)")
+    parser.add_argument("--font", default=FONT_PATH, help=f"字体文件路径 (默认: {FONT_PATH})")
+    parser.add_argument("--no-validate", action="store_true",
+                        help="跳过渲染前的策略预检 (validate_strategy.py)，有错误也继续渲染")
+    args = parser.parse_args()
 
-    config_file_path = os.path.abspath(sys.argv[1])
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    for profile in profiles:
+        if profile not in RENDER_PROFILES:
+            print(f"❌ 错误: 未知渲染档位: {profile} (可选: {', '.join(RENDER_PROFILES)})")
+            sys.exit(1)
+
+    config_file_path = os.path.abspath(args.config_file_path)
     
     if not os.path.exists(config_file_path):
         print(f"❌ 错误: 找不到策略文件: {config_file_path}")
@@ -255,7 +749,10 @@ def main():
     video_basename = config_basename.replace("-Strategy", "")
     
     video_path = os.path.join(downloads_dir, f"{video_basename}.mp4")
-    final_filename = f"{video_basename}-Clip.mp4"
+    # 每个档位一个成片: default 为 《金婚》第01集-Clip.mp4，其它档位带后缀
+    final_filenames = {
+        profile: f"{video_basename}-Clip{RENDER_PROFILES[profile]['suffix']}.mp4" for profile in profiles
+    }
 
     if not os.path.exists(video_path):
         print(f"❌ 错误: 找不到视频源文件: {video_path}")
@@ -279,28 +776,83 @@ def main():
     print(f"🎥 视频源: {video_path}")
     print(f"💾 输出目录: {output_dir}")
 
-    # 尝试查找头像
+    source_info = media_probe.probe(video_path)
+    if source_info:
+        keyframe = f", 关键帧间隔 {source_info.keyframe_interval:.1f}s" if source_info.keyframe_interval else ""
+        fps = f" {source_info.fps:.2f}fps" if source_info.fps else ""
+        print(f"🎞️ 源视频: {source_info.resolution}{fps} {source_info.video_codec}, "
+              f"时长 {format_clock(source_info.duration or 0)}{keyframe}")
+
+    # 加载策略数据
+    with open(config_file_path, "r", encoding="utf-8") as f:
+        strategy_data = json.load(f)
+
+    # 预检: 在任何编码开始前一次性检查所有片段（时间范围、字体、特殊字符、重叠等）
+    if not args.no_validate:
+        issues = validate_strategy.validate_strategy(
+            strategy_data, source_info.duration if source_info else None, args.font
+        )
+        if issues:
+            validate_strategy.print_issues(os.path.basename(config_file_path), issues)
+        if any(i["level"] == "error" for i in issues):
+            print("❌ 策略预检未通过，已停止渲染（确认无误可加 --no-validate 跳过）")
+            sys.exit(1)
+
+    # 尝试查找头像，并预处理为圆形 PNG（按内容哈希缓存在 temp_clips/assets 下）
     avatar_path = os.path.join(series_root, "images", "2.jpg")
     if not os.path.exists(avatar_path):
         avatar_path = None
     else:
         print(f"👤 找到头像: {avatar_path}")
+        avatar_path = prepare_avatar(avatar_path, os.path.join(temp_dir, "assets"))
+        if not avatar_path:
+            print("❌ 头像预处理失败")
+            sys.exit(1)
 
-    # 加载策略数据
-    with open(config_file_path, "r", encoding="utf-8") as f:
-        strategy_data = json.load(f)
+    # 每个 ffmpeg 任务的耗时记录，结束时写入成片旁边
+    timings_path = os.path.join(output_dir, f"{video_basename}-timings.json")
+    run_info = {"config": os.path.basename(config_file_path), "mode": args.mode, "bg_mode": args.bg_mode,
+                "jobs": args.jobs, "profiles": profiles}
+
+    if args.mode == "episode":
+        # 整集模式: 一个 ffmpeg 进程直接输出所有档位的成片
+        output_paths = {profile: os.path.join(output_dir, name) for profile, name in final_filenames.items()}
+        t0 = time.time()
+        if render_episode(strategy_data["clips"], video_path, temp_dir, output_paths, args.font, avatar_path,
+                          bg_mode=args.bg_mode):
+            for profile, output_path in output_paths.items():
+                check_output_size(profile, output_path)
+                print(f"✅✅✅ 任务完成！文件位置: {output_path} (耗时 {time.time() - t0:.1f}s)")
+        else:
+            print("❌ 整集渲染失败")
+        TIMINGS.save(timings_path, run_info)
+        return
 
-    valid_clips = []
-    # 按JSON中的顺序处理
-    for clip in strategy_data["clips"]:
-        res = process_clip(clip, video_path, temp_dir, FONT_PATH, avatar_path)
-        if res:
-            valid_clips.append(res)
+    # 渲染缓存：清单和片段都放在 temp_clips 下
+    cache = RenderCache(temp_dir, max_bytes=int(args.cache_size * 1024 ** 3))
+
+    # 按JSON中的顺序合并（渲染可以并行）
+    valid_clips = render_clips(
+        strategy_data["clips"], video_path, temp_dir, args.font, avatar_path,
+        mode=args.mode, jobs=args.jobs, cache=cache, bg_mode=args.bg_mode, profiles=profiles
+    )
+    cache.save()
+    cache.report()
             
     if valid_clips:
-        merge_final(valid_clips, output_dir, final_filename, temp_dir)
+        # 每个档位各自 concat（-c copy，不再重新转码）
+        # 片段时长直接取自策略，不再探测 temp_clips 里的临时文件
+        total_duration = sum(
+            time_to_seconds(clip["time_range"]["end"]) - time_to_seconds(clip["time_range"]["start"])
+            for clip, _ in valid_clips
+        )
+        for profile, final_filename in final_filenames.items():
+            merge_final([res[profile] for _, res in valid_clips], output_dir, final_filename, temp_dir,
+                        total_duration)
+            check_output_size(profile, os.path.join(output_dir, final_filename))
     else:
         print("❌ 没有生成任何有效片段")
+    TIMINGS.save(timings_path, run_info)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""
+内容寻址的片段渲染缓存
+缓存键 = 源文件指纹 + 片段时间范围/标题/解说 + 头像 + 字体 + 渲染参数 的哈希。
+任何一项变化都会得到新的键，因此修改某个片段只会重新渲染该片段。
+缓存清单保存在缓存目录下的 render_cache.json，超过容量上限时按最近最少使用 (LRU) 淘汰。
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+MANIFEST_NAME = "render_cache.json"
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3  # 20 GB
+SAMPLE_BYTES = 1024 * 1024  # 大文件只读取首尾各 1MB 参与指纹计算
+
+_fingerprint_memo = {}
+
+def file_fingerprint(path, full=False):
+    """
+    文件内容指纹。
+    full=False: 文件大小 + 首尾各 1MB 的哈希（适合几 GB 的视频源和字体）
+    full=True:  整个文件的哈希（适合头像这类小文件）
+    同一进程内按 (路径, 大小, mtime) 记忆，避免重复读取。
+    """
+    if not path or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, full)
+    if memo_key in _fingerprint_memo:
+        return _fingerprint_memo[memo_key]
+
+    h = hashlib.sha256()
+    h.update(str(stat.st_size).encode())
+    with open(path, "rb") as f:
+        if full or stat.st_size <= 2 * SAMPLE_BYTES:
+            for chunk in iter(lambda: f.read(SAMPLE_BYTES), b""):
+                h.update(chunk)
+        else:
+            h.update(f.read(SAMPLE_BYTES))
+            f.seek(-SAMPLE_BYTES, os.SEEK_END)
+            h.update(f.read(SAMPLE_BYTES))
+
+    digest = h.hexdigest()
+    _fingerprint_memo[memo_key] = digest
+    return digest
+
+def cache_key(parts):
+    """对任意可 JSON 序列化的字典计算稳定的哈希"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class RenderCache:
+    """
+    片段渲染缓存。线程安全，可供并行渲染的多个任务共享。
+    清单格式: {"entries": {key: {"file": 文件名, "size": 字节数, "last_used": 时间戳, "label": 描述}}}
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._pinned = set()  # 本次运行用到的条目，不参与淘汰
+        self.entries = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                entries = json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            print(f"⚠️ 渲染缓存清单损坏，已忽略: {self.manifest_path}")
+            return {}
+        # 丢弃文件已不存在或大小不符的条目
+        valid = {}
+        for key, entry in entries.items():
+            path = os.path.join(self.cache_dir, entry["file"])
+            if os.path.exists(path) and os.path.getsize(path) == entry["size"]:
+                valid[key] = entry
+        return valid
+
+    def path_for(self, key, prefix):
+        return os.path.join(self.cache_dir, f"{prefix}_{key[:16]}.mp4")
+
+    def lookup(self, key):
+        """命中时返回缓存文件路径并刷新最近使用时间，否则返回 None"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry:
+                path = os.path.join(self.cache_dir, entry["file"])
+                if os.path.exists(path) and os.path.getsize(path) == entry["size"]:
+                    entry["last_used"] = time.time()
+                    self._pinned.add(key)
+                    self.hits += 1
+                    return path
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def store(self, key, path, label=""):
+        """登记一个新渲染好的文件，并在超出容量时淘汰旧条目"""
+        with self._lock:
+            self.entries[key] = {
+                "file": os.path.basename(path),
+                "size": os.path.getsize(path),
+                "last_used": time.time(),
+                "label": label,
+            }
+            self._pinned.add(key)
+            self._evict()
+            self._save()
+
+    def total_bytes(self):
+        return sum(entry["size"] for entry in self.entries.values())
+
+    def _evict(self):
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self.entries.items(), key=lambda kv: kv[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key in self._pinned:
+                continue
+            path = os.path.join(self.cache_dir, entry["file"])
+            if os.path.exists(path):
+                os.remove(path)
+            total -= entry["size"]
+            del self.entries[key]
+            self.evicted += 1
+
+    def _save(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"entries": self.entries}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def save(self):
+        with self._lock:
+            self._evict()
+            self._save()
+
+    def report(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0
+        print(
+            f"📦 渲染缓存: 命中 {self.hits}, 未命中 {self.misses} (命中率 {hit_rate:.0f}%), "
+            f"淘汰 {self.evicted}, 占用 {self.total_bytes() / 1024 ** 2:.1f}MB / {self.max_bytes / 1024 ** 3:.1f}GB"
+        )
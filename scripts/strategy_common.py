@@ -0,0 +1,34 @@
+"""
+策略 JSON 的渲染和预检共用的配置与工具
+produce_short_video.py 和 validate_strategy.py 都从这里导入，预检不需要加载渲染器。
+"""
+
+FONT_PATH = "/System/Library/Fonts/STHeiti Medium.ttc"
+MAX_CHARS_PER_LINE = 16  # 解说每行最大字数（缩减一点，给头像留位置）
+
+def time_to_seconds(t_str):
+    h, m, s = map(float, t_str.split(':'))
+    return h * 3600 + m * 60 + s
+
+def format_clock(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+def wrap_commentary(commentary):
+    """按显示宽度把解说词切成多行（中文算 1，ASCII 算 0.5）"""
+    processed_lines = []
+    for line in commentary.split('\n'):
+        current_line = ""
+        count = 0
+        for char in line:
+            char_len = 1 if ord(char) > 127 else 0.5
+            if count + char_len > MAX_CHARS_PER_LINE:
+                processed_lines.append(current_line)
+                current_line = char
+                count = char_len
+            else:
+                current_line += char
+                count += char_len
+        if current_line:
+            processed_lines.append(current_line)
+    return processed_lines
@@ -0,0 +1,327 @@
+"""
+SRT 字幕数据模型
+解析后每条字幕的起止时间 (毫秒) 和序号存放在紧凑的 array 中，文本放在一个列表里；
+写回时逐字节还原原文件（BOM、换行符、空行数量、非标准写法的时间轴都会保留）。
+按开始时间排序的区间索引 + 前缀最大结束时间，可以用二分在 O(log n) 内找出与某个时间段重叠的字幕。
+iter_srt 逐条流式解析，处理很大的文件时不需要一次读入内存。
+"""
+
+import os
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+TIMING_RE = re.compile(
+    r"^\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})"
+)
+
+def seconds_to_ms(seconds):
+    # 与原 extract_subs.format_timestamp 完全一致：先取到微秒，再截断到毫秒
+    td = timedelta(seconds=seconds)
+    return td.days * 86400000 + td.seconds * 1000 + td.microseconds // 1000
+
+def format_ms(ms):
+    """毫秒 -> SRT 时间格式 HH:MM:SS,mmm"""
+    seconds, milliseconds = divmod(int(ms), 1000)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+def format_timestamp(seconds):
+    return format_ms(seconds_to_ms(seconds))
+
+def parse_time_ms(value):
+    """"HH:MM:SS,mmm" / "HH:MM:SS.mmm" / "MM:SS" / 秒数 -> 毫秒"""
+    value = str(value).strip().replace(",", ".")
+    parts = value.split(":")
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    return int(round(seconds * 1000))
+
+def format_cue(index, start_ms, end_ms, text):
+    """标准格式的一条字幕（末尾带一个空行）"""
+    return f"{index}\n{format_ms(start_ms)} --> {format_ms(end_ms)}\n{text}\n\n"
+
+def _parse_timing(line):
+    m = TIMING_RE.match(line)
+    if not m:
+        return None
+    g = [int(x) for x in m.groups()]
+    # 毫秒位数不足三位时按小数处理 ("1.5" = 1500ms)
+    start_frac = int(m.group(4).ljust(3, "0"))
+    end_frac = int(m.group(8).ljust(3, "0"))
+    start = ((g[0] * 60 + g[1]) * 60 + g[2]) * 1000 + start_frac
+    end = ((g[4] * 60 + g[5]) * 60 + g[6]) * 1000 + end_frac
+    return start, end
+
+class Cue:
+    """流式解析产生的一条字幕。raw_* 字段只在原文与标准写法不同时才有值"""
+    __slots__ = ("index", "start", "end", "text", "raw_index", "raw_timing", "blank_after", "raw_blank")
+
+    def __init__(self, index, start, end, text, raw_index=None, raw_timing=None, blank_after=1, raw_blank=None):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.text = text
+        self.raw_index = raw_index
+        self.raw_timing = raw_timing
+        self.blank_after = blank_after  # 后面的空行数；-1 表示文件在文本后直接结束（没有换行）
+        self.raw_blank = raw_blank  # 后面的空行原文（含空白字符或文件末尾没有换行时）
+
+def _read_lines(f):
+    """逐行读取，产出 (去掉行尾换行的内容, 是否以换行结尾, 是否为 CRLF)"""
+    for line in f:
+        if line.endswith("\r\n"):
+            yield line[:-2], True, True
+        elif line.endswith("\n"):
+            yield line[:-1], True, False
+        else:
+            yield line, False, False
+
+def _join_lines(items):
+    """把 _read_lines 产出的行按原样拼回（保留行内空白和各自的换行符）"""
+    return "".join(line + ("\r\n" if crlf else "\n" if has_newline else "") for line, has_newline, crlf in items)
+
+def iter_srt(source, header=None):
+    """
+    流式解析 SRT，逐条产出 Cue。source 为文件路径或已打开的文本文件对象（建议 newline=""）。
+    header 为字典时写入文件级信息 (bom, newline, leading_blank)，供无损写回使用。
+    一条字幕 = [序号行] + 时间轴行 + 文本行，直到遇到后面跟着新字幕（[序号行] + 时间轴行）的空行；
+    文本中间的空白行、纯数字行都算作文本（序号只能出现在空行之后、时间轴之前）。
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "r", encoding="utf-8", newline="") as f:
+            yield from iter_srt(f, header)
+        return
+
+    header = header if header is not None else {}
+    header.update(bom=False, newline="\n", leading_blank=0, leading_raw=None)
+    lines = _read_lines(source)
+
+    first = next(lines, None)
+    if first is None:
+        return
+    line, has_newline, crlf = first
+    if line.startswith("\ufeff"):
+        header["bom"] = True
+        line = line[1:]
+    header["newline"] = "\r\n" if crlf else "\n"
+    buffered = [(line, has_newline, crlf)]
+
+    def next_line():
+        if buffered:
+            return buffered.pop(0)
+        return next(lines, None)
+
+    def peek(k=0):
+        """第 k 个尚未读取的行，不消耗"""
+        while len(buffered) <= k:
+            item = next(lines, None)
+            if item is None:
+                return None
+            buffered.append(item)
+        return buffered[k]
+
+    def cue_starts():
+        # 下一行是时间轴，或是序号且再下一行是时间轴
+        first, second = peek(0), peek(1)
+        return _parse_timing(first[0]) is not None or (second is not None and _parse_timing(second[0]) is not None)
+
+    def keep_leading_raw():
+        raw = _join_lines(leading)
+        if raw != header["newline"] * len(leading):
+            header["leading_raw"] = raw
+
+    cue = None
+    text_lines = []
+    leading = []
+    while True:
+        item = next_line()
+        if item is None:
+            break
+        line, has_newline, _ = item
+
+        if cue is None:
+            if not line.strip():
+                # 第一条字幕之前的空行（字幕之间的空行在上一条结束时已经统计）
+                header["leading_blank"] += 1
+                leading.append(item)
+                continue
+            if leading:
+                keep_leading_raw()
+                leading = []
+            # 序号行（可选）+ 时间轴行
+            index, raw_index = None, None
+            timing = _parse_timing(line)
+            if timing is None:
+                index_line = line
+                item = next_line()
+                timing = _parse_timing(item[0]) if item else None
+                if timing is None:
+                    raise ValueError(f"SRT 格式错误: 序号 {index_line!r} 后没有可解析的时间轴")
+                line, has_newline, _ = item
+                stripped = index_line.strip()
+                index = int(stripped) if stripped.isdigit() else None
+                if index is None or str(index) != index_line:
+                    raw_index = index_line
+            start, end = timing
+            canonical = f"{format_ms(start)} --> {format_ms(end)}"
+            cue = Cue(index, start, end, "", raw_index, None if line == canonical else line)
+            text_lines = []
+            if not has_newline:
+                # 时间轴行就是文件最后一行
+                cue.blank_after = -1
+                yield cue
+                cue = None
+            continue
+
+        if line.strip():
+            text_lines.append(line)
+            if not has_newline:
+                cue.text = "\n".join(text_lines)
+                cue.blank_after = -1
+                yield cue
+                cue = None
+            continue
+
+        # 空行：后面是新字幕时这一条结束，统计连续空行数；否则是文本中间的空白行
+        blanks = [item]
+        while peek() is not None and not peek()[0].strip():
+            blanks.append(next_line())
+        if peek() is not None and not cue_starts():
+            text_lines.extend(blank[0] for blank in blanks)
+            continue
+        cue.text = "\n".join(text_lines)
+        cue.blank_after = len(blanks)
+        raw = _join_lines(blanks)
+        if raw != header["newline"] * len(blanks):
+            cue.raw_blank = raw
+        yield cue
+        cue = None
+
+    if leading:
+        keep_leading_raw()
+    if cue is not None:
+        # 文件以换行结束，但最后一条后面没有空行
+        cue.text = "\n".join(text_lines)
+        cue.blank_after = 0
+        yield cue
+
+class SubtitleTrack:
+    """
+    数组存储的字幕轨。
+    starts / ends / indexes: array('q')，texts: list[str]（多行文本以 "\\n" 连接）。
+    非标准的序号、时间轴写法和空行数量以稀疏字典保存，只用于无损写回。
+    """
+
+    def __init__(self):
+        self.starts = array("q")
+        self.ends = array("q")
+        self.indexes = array("q")
+        self.texts = []
+        self._raw_index = {}
+        self._raw_timing = {}
+        self._blank_after = {}  # 只记录不是 1 的
+        self._raw_blank = {}  # 只记录含空白字符或缺少换行的空行原文
+        self.header = {"bom": False, "newline": "\n", "leading_blank": 0, "leading_raw": None}
+        self._order = None
+        self._sorted_starts = None
+        self._prefix_max_end = None
+
+    def __len__(self):
+        return len(self.texts)
+
+    def append(self, start_ms, end_ms, text, index=None):
+        i = len(self.texts)
+        self.starts.append(int(start_ms))
+        self.ends.append(int(end_ms))
+        self.indexes.append(i + 1 if index is None else index)
+        self.texts.append(text)
+        self._order = None
+        return i
+
+    @classmethod
+    def load(cls, path):
+        track = cls()
+        for cue in iter_srt(path, track.header):
+            i = track.append(cue.start, cue.end, cue.text, -1 if cue.index is None else cue.index)
+            if cue.raw_index is not None:
+                track._raw_index[i] = cue.raw_index
+            if cue.raw_timing is not None:
+                track._raw_timing[i] = cue.raw_timing
+            if cue.blank_after != 1:
+                track._blank_after[i] = cue.blank_after
+            if cue.raw_blank is not None:
+                track._raw_blank[i] = cue.raw_blank
+        return track
+
+    def iter_cues(self):
+        """按文件顺序产出 (序号, 开始毫秒, 结束毫秒, 文本)"""
+        for i in range(len(self.texts)):
+            yield self.indexes[i], self.starts[i], self.ends[i], self.texts[i]
+
+    def text_lines(self):
+        """所有文本行，产出 (字幕位置, 行号, 行内容)，便于逐行处理后写回"""
+        for i, text in enumerate(self.texts):
+            for j, line in enumerate(text.split("\n")):
+                yield i, j, line
+
+    def render(self):
+        nl = self.header.get("newline", "\n")
+        out = ["\ufeff" if self.header.get("bom") else "",
+               self.header.get("leading_raw") or nl * self.header.get("leading_blank", 0)]
+        for i in range(len(self.texts)):
+            if i in self._raw_index:
+                out.append(self._raw_index[i] + nl)
+            elif self.indexes[i] >= 0:
+                out.append(f"{self.indexes[i]}{nl}")
+            out.append(self._raw_timing.get(i) or f"{format_ms(self.starts[i])} --> {format_ms(self.ends[i])}")
+            blank = self._blank_after.get(i, 1)
+            if blank == -1:
+                # 文件在这一条的最后一行后直接结束
+                out.append((nl + self.texts[i].replace("\n", nl)) if self.texts[i] else "")
+                continue
+            out.append(nl)
+            if self.texts[i]:
+                out.append(self.texts[i].replace("\n", nl) + nl)
+            out.append(self._raw_blank.get(i, nl * blank))
+        return "".join(out)
+
+    def save(self, path):
+        """原子写入：先写临时文件再替换"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    # ---- 区间索引 ----
+
+    def _build_index(self):
+        n = len(self.texts)
+        order = sorted(range(n), key=lambda i: (self.starts[i], self.ends[i]))
+        self._order = array("q", order)
+        self._sorted_starts = array("q", (self.starts[i] for i in order))
+        prefix = array("q")
+        running = -1
+        for i in order:
+            running = max(running, self.ends[i])
+            prefix.append(running)
+        self._prefix_max_end = prefix
+
+    def overlapping(self, start_ms, end_ms):
+        """
+        返回与 [start_ms, end_ms) 重叠的字幕位置（按开始时间排序）。
+        hi: 开始时间 < end_ms 的最后一条；lo: 前缀最大结束时间首次 > start_ms 的位置，
+        它之前的字幕必然都已结束，只需检查 [lo, hi) 这一小段。
+        """
+        if self._order is None:
+            self._build_index()
+        hi = bisect_left(self._sorted_starts, end_ms)
+        lo = bisect_right(self._prefix_max_end, start_ms, 0, hi)
+        return [self._order[k] for k in range(lo, hi) if self.ends[self._order[k]] > start_ms]
+
+    def in_range(self, time_range):
+        """按策略 JSON 的 time_range ({"start": "HH:MM:SS", "end": ...}) 查询字幕"""
+        return self.overlapping(parse_time_ms(time_range["start"]), parse_time_ms(time_range["end"]))
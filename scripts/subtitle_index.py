@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+整部剧的字幕全文检索
+为 series/<剧名>/downloads/ 下所有集的 SRT 建立字符 n-gram（单字 + 双字）倒排索引，中文无需分词。
+索引按集分片保存在 downloads/.subtitle_index.pickle，只重建大小或修改时间变化了的 SRT。
+查询返回 集数、毫秒时间范围、上下文，并给出可以直接填进策略 JSON 的 time_range。
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import pickle
+import argparse
+from array import array
+
+# Add script directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from subtitle import SubtitleTrack, format_ms
+
+INDEX_NAME = ".subtitle_index.pickle"
+INDEX_VERSION = 1
+# 索引和查询时都忽略空白和标点，"你好，世界" 可以搜到 "你好世界"
+NORMALIZE_RE = re.compile(r"[\s\W_]+")
+
+def normalize(text):
+    return NORMALIZE_RE.sub("", text).lower()
+
+def ngrams(text):
+    """单字 + 相邻双字"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+def episode_number(name):
+    m = re.search(r"第\s*(\d+)\s*集", name) or re.search(r"(\d+)(?!.*\d)", name)
+    return int(m.group(1)) if m else None
+
+def seconds_clock(ms, round_up=False):
+    """毫秒 -> 策略 JSON 用的 HH:MM:SS（开始向下取整、结束向上取整，保证片段覆盖整句台词）"""
+    seconds = math.ceil(ms / 1000) if round_up else ms // 1000
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def resolve_downloads(path):
+    """接受 series/<剧名> 或其 downloads 目录"""
+    downloads = os.path.join(path, "downloads")
+    return downloads if os.path.isdir(downloads) else path
+
+def find_srt_files(downloads_dir):
+    """每集一个 SRT：有 _fixed.srt 时优先使用修正版，忽略 _ocr.srt 和审核报告"""
+    by_episode = {}
+    for name in sorted(os.listdir(downloads_dir)):
+        if not name.endswith(".srt") or name.endswith("_ocr.srt"):
+            continue
+        episode = name[:-len("_fixed.srt")] if name.endswith("_fixed.srt") else name[:-len(".srt")]
+        if name.endswith("_fixed.srt") or episode not in by_episode:
+            by_episode[episode] = os.path.join(downloads_dir, name)
+    return by_episode
+
+def build_shard(srt_path):
+    """
+    一集的索引分片: 字幕数组 + {n-gram: 字幕位置}。
+    倒排表存为 uint32 的原始字节，pickle 读写比成千上万个小 array 对象快几倍。
+    """
+    track = SubtitleTrack.load(srt_path)
+    postings = {}
+    normalized = []
+    for i, text in enumerate(track.texts):
+        norm = normalize(text)
+        normalized.append(norm)
+        for gram in ngrams(norm):
+            postings.setdefault(gram, array("I")).append(i)
+    stat = os.stat(srt_path)
+    return {
+        "path": srt_path,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "starts": track.starts,
+        "ends": track.ends,
+        "texts": track.texts,
+        "normalized": normalized,
+        "postings": {gram: positions.tobytes() for gram, positions in postings.items()},
+    }
+
+class SubtitleIndex:
+    def __init__(self, downloads_dir):
+        self.downloads_dir = downloads_dir
+        self.index_path = os.path.join(downloads_dir, INDEX_NAME)
+        self.shards = {}
+
+    def load(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                data = pickle.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self.shards = data["shards"]
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError):
+            self.shards = {}
+        return self
+
+    def save(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"version": INDEX_VERSION, "shards": self.shards}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.index_path)
+
+    def update(self, rebuild=False):
+        """增量更新：新增/变化的 SRT 重建分片，已删除的集移出索引。返回 (更新数, 删除数)"""
+        files = find_srt_files(self.downloads_dir)
+        updated = 0
+        for episode, srt_path in files.items():
+            shard = self.shards.get(episode)
+            stat = os.stat(srt_path)
+            if (not rebuild and shard and shard["path"] == srt_path
+                    and shard["size"] == stat.st_size and shard["mtime_ns"] == stat.st_mtime_ns):
+                continue
+            try:
+                self.shards[episode] = build_shard(srt_path)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 跳过无法解析的字幕 {os.path.basename(srt_path)}: {e}")
+                self.shards.pop(episode, None)
+                continue
+            updated += 1
+        removed = [episode for episode in self.shards if episode not in files]
+        for episode in removed:
+            del self.shards[episode]
+        if updated or removed:
+            self.save()
+        return updated, len(removed)
+
+    def search(self, query, context=1, limit=None):
+        """
+        返回命中列表。先用查询的 n-gram 求倒排表交集得到候选字幕，再在规范化文本上确认子串匹配。
+        """
+        norm = normalize(query)
+        if not norm:
+            return []
+        grams = sorted(ngrams(norm) if len(norm) == 1 else {norm[i:i + 2] for i in range(len(norm) - 1)},
+                       key=len, reverse=True)
+        hits = []
+        for episode in sorted(self.shards, key=lambda e: (episode_number(e) or 0, e)):
+            shard = self.shards[episode]
+            lists = [shard["postings"].get(gram) for gram in grams]
+            if not all(lists):
+                continue
+            # 从最短的倒排表开始求交集
+            lists.sort(key=len)
+            candidates = set(memoryview(lists[0]).cast("I"))
+            for postings in lists[1:]:
+                candidates.intersection_update(memoryview(postings).cast("I"))
+                if not candidates:
+                    break
+            for i in sorted(candidates):
+                if norm not in shard["normalized"][i]:
+                    continue
+                start_ms, end_ms = shard["starts"][i], shard["ends"][i]
+                lo, hi = max(0, i - context), min(len(shard["texts"]), i + context + 1)
+                hits.append({
+                    "episode": episode,
+                    "episode_number": episode_number(episode),
+                    "cue": i + 1,
+                    "start_ms": start_ms,
+                    "end_ms": end_ms,
+                    "start": format_ms(start_ms),
+                    "end": format_ms(end_ms),
+                    "time_range": {"start": seconds_clock(start_ms), "end": seconds_clock(end_ms, round_up=True)},
+                    "text": shard["texts"][i],
+                    "context": [
+                        {"start_ms": shard["starts"][k], "end_ms": shard["ends"][k], "text": shard["texts"][k]}
+                        for k in range(lo, hi)
+                    ],
+                })
+                if limit and len(hits) >= limit:
+                    return hits
+        return hits
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="在整部剧的字幕中检索台词",
+        epilog="示例: uv run scripts/subtitle_index.py series/jinhun 分房子"
+    )
+    parser.add_argument("series_dir", help="剧目录 (series/<剧名>) 或其 downloads 目录")
+    parser.add_argument("query", nargs="*", help="要查找的台词（可以只写一部分，忽略标点和空格）")
+    parser.add_argument("-C", "--context", type=int, default=1, help="每个命中前后显示的字幕条数 (默认: 1)")
+    parser.add_argument("-n", "--limit", type=int, default=50, help="最多显示的命中数 (默认: 50, 0 为不限)")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出命中（含 time_range）")
+    parser.add_argument("--rebuild", action="store_true", help="忽略已有索引，全部重建")
+    args = parser.parse_args()
+
+    downloads_dir = resolve_downloads(args.series_dir)
+    if not os.path.isdir(downloads_dir):
+        print(f"❌ 目录不存在: {downloads_dir}")
+        sys.exit(1)
+
+    index = SubtitleIndex(downloads_dir).load()
+    updated, removed = index.update(rebuild=args.rebuild)
+    if updated or removed:
+        print(f"📇 索引已更新: {updated} 集重建, {removed} 集移除, 共 {len(index.shards)} 集", file=sys.stderr)
+    if not args.query:
+        return
+
+    hits = index.search(" ".join(args.query), context=args.context, limit=args.limit or None)
+    if args.json:
+        print(json.dumps(hits, ensure_ascii=False, indent=2))
+        return
+
+    if not hits:
+        print("没有找到匹配的台词")
+        return
+    for hit in hits:
+        time_range = json.dumps(hit["time_range"], ensure_ascii=False)
+        print(f"\n🎬 {hit['episode']}  {hit['start']} --> {hit['end']}  "
+              f"({hit['start_ms']}-{hit['end_ms']}ms)  \"time_range\": {time_range}")
+        for ctx in hit["context"]:
+            marker = "👉" if ctx["start_ms"] == hit["start_ms"] and ctx["text"] == hit["text"] else "  "
+            print(f"   {marker} [{format_ms(ctx['start_ms'])}] {ctx['text'].replace(chr(10), ' / ')}")
+    print(f"\n共 {len(hits)} 处命中")
+
+if __name__ == "__main__":
+    main()
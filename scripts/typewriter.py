@@ -0,0 +1,129 @@
+"""
+打字机效果字幕引擎
+把解说词生成为一条带逐字显示时间的 ASS 字幕轨，再用一个 subtitles 滤镜烧录进画面。
+滤镜图里只有一个滤镜，构建时间和每帧渲染开销不再随解说字数增长。
+"""
+
+import os
+import re
+import subprocess
+
+PLAY_RES_X = 1080
+PLAY_RES_Y = 1920
+DEFAULT_FONT_FAMILY = "Heiti SC"  # STHeiti Medium.ttc 的字体族名
+
+# ASS 颜色格式为 &HAABBGGRR，AA=FF 表示完全透明
+COLOR_YELLOW = "&H0000FFFF"
+COLOR_BLACK = "&H00000000"
+COLOR_HIDDEN = "&HFF00FFFF"
+
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: {play_res_x}
+PlayResY: {play_res_y}
+WrapStyle: 2
+ScaledBorderAndShadow: yes
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Typewriter,{font_family},{font_size},{primary},{secondary},{outline_color},{outline_color},0,0,0,0,100,100,0,0,1,{outline},0,7,0,0,0,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+def font_family(font_path, default=DEFAULT_FONT_FAMILY):
+    """
+    读取字体文件的字体族名（依赖 fontconfig 的 fc-query，不可用时返回默认值）。
+    .ttc 字体集合里有多个字体（如 STHeiti Medium.ttc 的 Heiti SC / Heiti TC），只取 drawtext 默认使用的第 0 个
+    """
+    try:
+        result = subprocess.run(
+            ["fc-query", "--index", "0", "--format", "%{family[0]}\n", font_path],
+            capture_output=True, text=True, check=True
+        )
+        lines = result.stdout.strip().splitlines()
+        family = lines[0].strip() if lines else ""
+        if family:
+            return family
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return default
+
+def ass_time(centiseconds):
+    """厘秒 -> ASS 时间格式 H:MM:SS.cc"""
+    centiseconds = max(0, int(centiseconds))
+    hours, rem = divmod(centiseconds, 360000)
+    minutes, rem = divmod(rem, 6000)
+    seconds, cs = divmod(rem, 100)
+    return f"{hours}:{minutes:02d}:{seconds:02d}.{cs:02d}"
+
+def escape_ass_text(text):
+    # 花括号会被当作覆盖标签，反斜杠会被当作转义
+    text = text.replace("\\", "\\\u200b")
+    return text.replace("{", "\\{").replace("}", "\\}")
+
+def build_typewriter_ass(lines, typing_speed, start_delay, clip_duration, x_pos=None,
+                         base_y=1420, line_height=80, font_size=50, outline=2,
+                         font_family_name=DEFAULT_FONT_FAMILY):
+    """
+    生成打字机效果的 ASS 文本。
+    x_pos 为数字时文字左对齐于该横坐标：每行一个事件，用 \\ko 卡拉OK 标签逐字显现；
+    x_pos 为 None 时文字水平居中：与 drawtext 版本一样，每个前缀一个事件，已打出的部分始终居中。
+    逐字显现时间与原 drawtext 链一致：第 k 个字在 行起始 + (k-1) * typing_speed 出现。
+    """
+    end_cs = round(clip_duration * 100)
+    events = []
+    current_line_start_time = start_delay
+
+    for i, line in enumerate(lines):
+        if not line:
+            continue
+        current_y = base_y + i * line_height
+        reveal_cs = [round((current_line_start_time + k * typing_speed) * 100) for k in range(len(line))]
+
+        if x_pos is not None:
+            # 左对齐：字的位置固定，只需控制每个字出现的时刻
+            parts = []
+            for k, char in enumerate(line):
+                next_cs = reveal_cs[k + 1] if k + 1 < len(line) else reveal_cs[k] + 1
+                parts.append(f"{{\\ko{next_cs - reveal_cs[k]}}}{escape_ass_text(char)}")
+            events.append((reveal_cs[0], end_cs, f"{{\\an7\\pos({x_pos},{current_y})}}" + "".join(parts)))
+        else:
+            # 居中：每个前缀单独一个事件，随字数增长重新居中
+            pos_tag = f"{{\\an8\\pos({PLAY_RES_X // 2},{current_y})}}"
+            for j in range(1, len(line)):
+                events.append((reveal_cs[j - 1], reveal_cs[j], pos_tag + escape_ass_text(line[:j])))
+            events.append((reveal_cs[-1], end_cs, pos_tag + escape_ass_text(line)))
+
+        # 累计下一行的开始时间
+        current_line_start_time += len(line) * typing_speed
+
+    header = ASS_HEADER.format(
+        play_res_x=PLAY_RES_X, play_res_y=PLAY_RES_Y,
+        font_family=font_family_name, font_size=font_size,
+        primary=COLOR_YELLOW, secondary=COLOR_HIDDEN,
+        outline_color=COLOR_BLACK, outline=outline
+    )
+    body = "".join(
+        f"Dialogue: 0,{ass_time(start)},{ass_time(end)},Typewriter,,0,0,0,,{text}\n"
+        for start, end, text in events if end > start
+    )
+    return header + body
+
+def write_typewriter_ass(ass_path, lines, typing_speed, start_delay, clip_duration, **kwargs):
+    with open(ass_path, "w", encoding="utf-8") as f:
+        f.write(build_typewriter_ass(lines, typing_speed, start_delay, clip_duration, **kwargs))
+    return ass_path
+
+def escape_filter_value(value):
+    """转义 filter_complex 中的选项值（先转义选项层，再转义滤镜图层）"""
+    value = value.replace("\\", "\\\\").replace("'", "\\'").replace(":", "\\:")
+    return re.sub(r"([\\'\[\],;])", r"\\\1", value)
+
+def subtitles_filter(ass_path, fonts_dir=None):
+    """返回烧录 ASS 字幕轨的单个滤镜"""
+    filter_str = f"subtitles=filename={escape_filter_value(os.path.abspath(ass_path))}"
+    if fonts_dir:
+        filter_str += f":fontsdir={escape_filter_value(os.path.abspath(fonts_dir))}"
+    return filter_str
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+渲染前的策略 JSON 预检
+一次遍历检查所有片段：字段结构、time_range 格式与先后、duration 字段、是否超出源视频时长（读 media_probe 缓存）、
+片段之间是否重叠、字体是否存在、标题里是否有 drawtext 无法显示的控制字符、解说行数和长度。
+不启动编码，命中探测缓存时整个目录也只需几毫秒；produce_short_video.py 渲染前会自动调用。
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+# Add script directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import media_probe
+from strategy_common import FONT_PATH, MAX_CHARS_PER_LINE, time_to_seconds, format_clock, wrap_commentary
+
+TIME_RE = re.compile(r"^\d{1,2}:[0-5]\d:[0-5]\d(\.\d+)?$")
+DURATION_TOLERANCE = 1.0  # duration 字段与 time_range 允许的差异（秒）
+MIN_CLIP_SECONDS = 15  # 片段时长建议范围，见 docs/jinhun_script_prompt.md
+MAX_CLIP_SECONDS = 60
+MAX_TITLE_WIDTH = 13  # 标题 80px 字号在 1080 宽的画面里一行最多约 13 个汉字（ASCII 算半个）
+MAX_COMMENTARY_LINES = 3  # 自动折行后的最大行数，再多会遮挡画面
+MIN_TYPING_SPEED = 0.08  # 每字最短显示时间（秒），低于它解说读不完
+VIDEO_EXTENSIONS = [".mp4", ".mkv", ".avi", ".mov"]
+PROBE_WORKERS = 8
+
+def issue(level, clip_id, message):
+    return {"level": level, "clip": clip_id, "message": message}
+
+def find_source_video(config_path):
+    """与 produce_short_video.main 相同的规则：series/<剧名>/config/<集>-Strategy.json -> downloads/<集>.mp4"""
+    config_dir = os.path.dirname(os.path.abspath(config_path))
+    series_root = os.path.dirname(config_dir)
+    downloads_dir = os.path.join(series_root, "downloads")
+    video_basename = os.path.splitext(os.path.basename(config_path))[0].replace("-Strategy", "")
+    for ext in VIDEO_EXTENSIONS:
+        path = os.path.join(downloads_dir, f"{video_basename}{ext}")
+        if os.path.exists(path):
+            return path
+    return None
+
+def undrawable_chars(text):
+    """
+    标题里 drawtext 无法显示的字符：换行、制表符等控制字符和零宽字符。
+    % \\ ' : 等由 escape_text 逐级转义；解说走 ASS 字幕，不受这些限制
+    """
+    return sorted({char for char in text if unicodedata.category(char) in ("Cc", "Cf")})
+
+def valid_clip_id(clip_id):
+    """片段 id 会用在临时文件名里：必须是非空字符串，且不含路径分隔符"""
+    return isinstance(clip_id, str) and bool(clip_id.strip()) and not any(sep in clip_id for sep in ("/", "\\", "\0"))
+
+def check_font(font_path):
+    if not os.path.exists(font_path):
+        return [issue("error", None, f"字体文件不存在: {font_path}")]
+    if "'" in font_path:
+        # drawtext 的 fontfile='...' 无法包含单引号
+        return [issue("error", None, f"字体路径含单引号，无法写入滤镜: {font_path}")]
+    return []
+
+def check_clip(clip, source_duration=None):
+    """检查单个片段，返回 (问题列表, (开始秒, 结束秒) 或 None)"""
+    issues = []
+    clip_id = clip.get("id") if isinstance(clip, dict) else None
+    if not isinstance(clip, dict):
+        return [issue("error", None, "片段不是 JSON 对象")], None
+
+    for field in ("id", "time_range", "title", "commentary_text"):
+        if field not in clip:
+            issues.append(issue("error", clip_id, f"缺少字段 {field}"))
+    if issues:
+        return issues, None
+    if not valid_clip_id(clip_id):
+        issues.append(issue("error", None, f"片段 id 必须是不含路径分隔符的非空字符串: {clip_id!r}"))
+
+    time_range = clip["time_range"]
+    start = time_range.get("start") if isinstance(time_range, dict) else None
+    end = time_range.get("end") if isinstance(time_range, dict) else None
+    span = None
+    if not all(isinstance(t, str) and TIME_RE.match(t) for t in (start, end)):
+        issues.append(issue("error", clip_id, f"time_range 格式错误 (应为 HH:MM:SS): {time_range}"))
+    else:
+        start_s, end_s = time_to_seconds(start), time_to_seconds(end)
+        length = end_s - start_s
+        if length <= 0:
+            issues.append(issue("error", clip_id, f"结束时间 {end} 不晚于开始时间 {start}"))
+        else:
+            span = (start_s, end_s)
+            if not MIN_CLIP_SECONDS <= length <= MAX_CLIP_SECONDS:
+                issues.append(issue("warning", clip_id,
+                                    f"片段时长 {length:.0f}s 不在建议范围 {MIN_CLIP_SECONDS}-{MAX_CLIP_SECONDS}s"))
+        if source_duration and end_s > source_duration:
+            issues.append(issue("error", clip_id,
+                                f"结束时间 {end} 超出源视频时长 {format_clock(source_duration)}"))
+        duration = clip.get("duration")
+        if duration is not None:
+            if not isinstance(duration, (int, float)) or isinstance(duration, bool):
+                issues.append(issue("error", clip_id, f"duration 不是数字: {duration!r}"))
+            elif span and abs(duration - length) > DURATION_TOLERANCE:
+                issues.append(issue("error", clip_id,
+                                    f"duration={duration} 与 time_range 的 {length:.0f}s 不一致"))
+
+    title = clip["title"]
+    commentary = clip["commentary_text"]
+    if not isinstance(title, str) or not title.strip():
+        issues.append(issue("error", clip_id, "title 为空"))
+    else:
+        bad = undrawable_chars(title)
+        if bad:
+            issues.append(issue("error", clip_id, f"标题含无法显示的字符: {', '.join(map(repr, bad))}"))
+        width = sum(1 if ord(char) > 127 else 0.5 for char in title)
+        if width > MAX_TITLE_WIDTH:
+            issues.append(issue("warning", clip_id, f"标题宽度 {width:g} 字，超过 {MAX_TITLE_WIDTH} 字会超出画面"))
+
+    if not isinstance(commentary, str) or not commentary.strip():
+        issues.append(issue("error", clip_id, "commentary_text 为空"))
+        return issues, span
+    long_lines = [line for line in commentary.split("\n") if len(wrap_commentary(line)) > 1]
+    if long_lines:
+        issues.append(issue("warning", clip_id,
+                            f"{len(long_lines)} 行解说超过 {MAX_CHARS_PER_LINE} 字，会被自动折行: {long_lines[0]}"))
+    wrapped = wrap_commentary(commentary)
+    if len(wrapped) > MAX_COMMENTARY_LINES:
+        issues.append(issue("warning", clip_id, f"解说折行后共 {len(wrapped)} 行，超过 {MAX_COMMENTARY_LINES} 行会遮挡画面"))
+    if span:
+        # 与 build_layout_graph 的打字速度计算一致
+        total_chars = sum(len(line) for line in wrapped)
+        speed = max(1.0, (span[1] - span[0]) * 0.9 - 0.2) / max(1, total_chars)
+        if speed < MIN_TYPING_SPEED:
+            issues.append(issue("warning", clip_id,
+                                f"解说 {total_chars} 字对 {span[1] - span[0]:.0f}s 的片段太长 ({speed:.3f}s/字)"))
+    return issues, span
+
+def validate_strategy(strategy, source_duration=None, font_path=None):
+    """校验已加载的策略数据，返回问题列表 [{"level": "error"|"warning", "clip": id, "message": ...}]"""
+    issues = check_font(font_path) if font_path else []
+    clips = strategy.get("clips") if isinstance(strategy, dict) else None
+    if not isinstance(clips, list) or not clips:
+        issues.append(issue("error", None, "clips 缺失或为空"))
+        return issues
+
+    spans = []
+    seen_ids = set()
+    for clip in clips:
+        clip_issues, span = check_clip(clip, source_duration)
+        issues.extend(clip_issues)
+        clip_id = clip.get("id") if isinstance(clip, dict) else None
+        if valid_clip_id(clip_id):
+            if clip_id in seen_ids:
+                issues.append(issue("error", clip_id, "片段 id 重复"))
+            seen_ids.add(clip_id)
+        if span:
+            spans.append((span[0], span[1], clip_id))
+
+    # 按开始时间排序后只需和之前最晚结束的片段比较
+    spans.sort(key=lambda s: (s[0], s[1]))
+    latest_end, latest_id = None, None
+    for start_s, end_s, clip_id in spans:
+        if latest_end is not None and start_s < latest_end:
+            issues.append(issue("warning", clip_id,
+                                f"与 {latest_id} 重叠 {min(latest_end, end_s) - start_s:.0f}s"))
+        if latest_end is None or end_s > latest_end:
+            latest_end, latest_id = end_s, clip_id
+    return issues
+
+def validate_file(config_path, font_path=None, video_path=None):
+    """校验一个策略文件：读取 JSON、定位源视频并读取（缓存的）探测信息"""
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            strategy = json.load(f)
+    except (OSError, ValueError) as e:
+        return [issue("error", None, f"无法读取策略文件: {e}")]
+
+    issues = []
+    video_path = video_path or find_source_video(config_path)
+    source_duration = None
+    if not video_path:
+        issues.append(issue("error", None, "找不到源视频"))
+    else:
+        info = media_probe.probe(video_path)
+        source_duration = info.duration if info else None
+        if not source_duration:
+            issues.append(issue("warning", None, f"无法探测源视频时长，跳过越界检查: {video_path}"))
+    return issues + validate_strategy(strategy, source_duration, font_path)
+
+def print_issues(name, issues):
+    errors = sum(1 for i in issues if i["level"] == "error")
+    if not issues:
+        print(f"✅ {name}")
+        return
+    print(f"{'❌' if errors else '⚠️'} {name}: {errors} 个错误, {len(issues) - errors} 个警告")
+    for i in issues:
+        icon = "❌" if i["level"] == "error" else "⚠️"
+        prefix = f"[{i['clip']}] " if i["clip"] is not None else ""
+        print(f"   {icon} {prefix}{i['message']}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="渲染前检查策略 JSON（单个文件或整个 config 目录）",
+        epilog="示例: uv run scripts/validate_strategy.py series/jinhun/config"
+    )
+    parser.add_argument("path", help="策略 JSON 文件或 config 目录")
+    parser.add_argument("--font", default=FONT_PATH, help=f"字体文件路径 (默认: {FONT_PATH})")
+    parser.add_argument("--strict", action="store_true", help="有警告也返回非零退出码")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.path):
+        config_files = sorted(
+            os.path.join(args.path, name) for name in os.listdir(args.path) if name.endswith("-Strategy.json")
+        )
+    elif os.path.exists(args.path):
+        config_files = [args.path]
+    else:
+        print(f"❌ 路径不存在: {args.path}")
+        sys.exit(2)
+
+    # 字体只检查一次；未命中探测缓存时每集需要一次 ffprobe，并行探测
+    font_issues = check_font(args.font)
+    if font_issues:
+        print_issues("字体", font_issues)
+    with ThreadPoolExecutor(max_workers=max(1, min(PROBE_WORKERS, len(config_files)))) as executor:
+        results = list(executor.map(validate_file, config_files))
+
+    failed = 1 if font_issues else 0
+    for config_path, issues in zip(config_files, results):
+        print_issues(os.path.basename(config_path), issues)
+        if any(i["level"] == "error" for i in issues) or (args.strict and issues):
+            failed += 1
+    print(f"\n📋 共检查 {len(config_files)} 个策略文件，{failed} 个未通过")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()